@@ -34,7 +34,8 @@ admin.site.unregister(SocialToken)
 class UserAdmin(BaseUserAdmin, ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'plan', 'date_joined')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'plan', 'date_joined')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    list_select_related = ('plan',)
+    search_fields = ('username', '=email')
     readonly_fields = ('date_joined', 'last_login', 'stripe_subscription_id', 'stripe_subscription_status', 'stripe_customer_id')
     ordering = ('-date_joined',)
     date_hierarchy = 'date_joined'
@@ -78,7 +79,7 @@ class UserAdmin(BaseUserAdmin, ModelAdmin):
 class PlanAdmin(ModelAdmin):
     list_display = ('name', 'stripe_price_id_monthly', 'stripe_price_id_yearly', 'created_at')
     list_filter = ('created_at',)
-    search_fields = ('name', 'stripe_price_id_monthly', 'stripe_price_id_yearly')
+    search_fields = ('name', 'stripe_price_id_monthly__exact', 'stripe_price_id_yearly__exact')
     ordering = ('name',)
     readonly_fields = ('created_at',)
     
@@ -4,4 +4,8 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        import core.signals        
\ No newline at end of file
+        import core.signals
+        from core.log_queue import start_queue_logging
+
+        # Keep log I/O off the request path for the app loggers
+        start_queue_logging(['core', 'cv'])
@@ -0,0 +1,180 @@
+# core/cache_utils.py
+import random
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PLANS_VERSION_KEY = 'plans_version'
+PLANS_LIST_TIMEOUT = 60 * 60  # 1 hour
+
+
+def _initial_version():
+    # Seeded from the clock so a version key lost to eviction never comes
+    # back at a value whose list entries may still be cached
+    return int(time.time())
+
+
+def get_plans_version():
+    """
+    Current namespace version for cached plan lists.
+    """
+    return cache.get_or_set(PLANS_VERSION_KEY, _initial_version, timeout=None)
+
+
+def bump_plans_version():
+    """
+    Invalidate every cached plan list at once by moving to a new key namespace.
+    Stale entries are never read again and simply expire.
+    """
+    try:
+        cache.incr(PLANS_VERSION_KEY)
+    except ValueError:
+        cache.set(PLANS_VERSION_KEY, _initial_version(), timeout=None)
+
+
+def counter_window_key(key, now, duration):
+    """
+    Key of the fixed-window counter for ``key`` covering ``now``.
+    """
+    return f'{key}:{int(now // duration)}'
+
+
+def incr_window_counter(key, now, duration):
+    """
+    Count one hit in ``key``'s fixed window of ``duration`` seconds covering
+    ``now`` and return the window's count so far. cache.incr is an atomic
+    INCR on Redis; a missing counter is created with add(), so two racing
+    first hits can't both reset it to 1.
+    """
+    counter_key = counter_window_key(key, now, duration)
+    try:
+        return cache.incr(counter_key)
+    except ValueError:
+        if cache.add(counter_key, 1, duration):
+            return 1
+        return cache.incr(counter_key)
+
+
+def jittered_ttl(base, pct=0.1):
+    """
+    ``base`` seconds +/- ``pct``, so entries written together (after a deploy
+    or an invalidation) don't all expire in the same instant.
+    """
+    return int(base * (1 + random.uniform(-pct, pct)))
+
+
+_request_state = threading.local()
+
+
+def invalidate_on_commit(func):
+    """
+    Run the cache invalidation ``func`` once the current changes are committed.
+    Inside a request wrapped by CacheInvalidationMiddleware it runs once at the
+    end of the request, however many times it was scheduled.
+    """
+    pending = getattr(_request_state, 'pending', None)
+    if pending is None:
+        transaction.on_commit(func)
+    else:
+        pending[func] = None
+
+
+def start_request_invalidations():
+    _request_state.pending = {}
+
+
+def flush_request_invalidations():
+    pending = getattr(_request_state, 'pending', None)
+    _request_state.pending = None
+    for func in pending or ():
+        func()
+
+
+def plans_list_cache_key(variant):
+    # The suffix names the stored format (JSON bytes), so entries written in
+    # an older format are never read back
+    return f'plans_list_{variant}_v{get_plans_version()}_json'
+
+
+def plans_list_response_cache_key(list_key, user_plan_id):
+    """
+    Rendered plan-list response for users on ``user_plan_id`` (None when
+    anonymous or planless); is_current is the only per-user field.
+    """
+    return f'{list_key}_p{user_plan_id or 0}_raw'
+
+
+def get_or_set_single_flight(key, producer, timeout, cacheable=None, lock_timeout=5, poll_interval=0.05):
+    """
+    cache.get_or_set for values that are expensive to build. On a miss only
+    the caller holding a short-lived lock runs ``producer``; concurrent callers
+    poll for its result and only build the value themselves if the lock
+    holder hasn't stored anything within ``lock_timeout`` seconds.
+
+    ``cacheable(value)`` can veto storing a value (e.g. a partial result).
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'lock:{key}'
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.get(lock_key) is None:
+                # Holder finished without caching; don't wait out the timeout
+                break
+        return producer()
+
+    try:
+        value = producer()
+        if cacheable is None or cacheable(value):
+            cache.set(key, value, timeout=jittered_ttl(timeout))
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+class LocalTTLCache:
+    """
+    Small thread-safe in-process cache with a fixed TTL, for hot values that
+    would otherwise cost a Redis round trip on every read.
+    """
+
+    def __init__(self, ttl, maxsize=512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -3,6 +3,13 @@ from rest_framework.views import exception_handler
 from rest_framework import status
 from rest_framework.response import Response
 
+# Upgrade suggestion shown for each plan when its rate limit is hit
+_UPGRADE_SUGGESTIONS = {
+    'Free': {'recommended_plan': 'Basic', 'new_limit': '20 AI responses/day'},
+    'Basic': {'recommended_plan': 'Pro', 'new_limit': '100 AI responses/day'},
+    'Pro': {'recommended_plan': 'Premium', 'new_limit': 'Unlimited AI responses'},
+}
+
 def custom_exception_handler(exc, context):
     """
     Custom exception handler that provides detailed rate limit information.
@@ -31,16 +38,9 @@ def custom_exception_handler(exc, context):
             }
             
             # Add plan-specific upgrade suggestions
-            current_plan = throttle_info.get('current_plan', 'Free')
-            if current_plan == 'Free':
-                custom_response_data['suggestion']['recommended_plan'] = 'Basic'
-                custom_response_data['suggestion']['new_limit'] = '20 AI responses/day'
-            elif current_plan == 'Basic':
-                custom_response_data['suggestion']['recommended_plan'] = 'Pro'
-                custom_response_data['suggestion']['new_limit'] = '100 AI responses/day'
-            elif current_plan == 'Pro':
-                custom_response_data['suggestion']['recommended_plan'] = 'Premium'
-                custom_response_data['suggestion']['new_limit'] = 'Unlimited AI responses'
+            suggestion = _UPGRADE_SUGGESTIONS.get(throttle_info.get('current_plan', 'Free'))
+            if suggestion:
+                custom_response_data['suggestion'].update(suggestion)
             
             response.data = custom_response_data
         else:
@@ -0,0 +1,51 @@
+# core/log_queue.py
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+_queue_handler = None
+
+
+def start_queue_logging(logger_names):
+    """
+    Route the given loggers through a QueueHandler so request threads only
+    enqueue records; a background QueueListener does the stream/file I/O
+    with the handlers configured in settings.LOGGING.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    loggers = [logging.getLogger(name) for name in logger_names]
+    handlers = []
+    for logger in loggers:
+        for handler in logger.handlers:
+            if handler not in handlers:
+                handlers.append(handler)
+    if not handlers:
+        return
+
+    _queue_handler = QueueHandler(queue.SimpleQueue())
+    for logger in loggers:
+        logger.handlers = [_queue_handler]
+
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+    # Forked workers (e.g. celery prefork) don't inherit the listener thread
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_in_child():
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_queue_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
@@ -81,8 +81,8 @@ class Command(BaseCommand):
         
         if dry_run:
             self.stdout.write("   [DRY-RUN] Would delete these AI responses:")
-            for response in old_responses[:10]:  # Show first 10
-                self.stdout.write(f"     - Response {response.id} from {response.created_at}")
+            for response_id, created_at in old_responses.values_list('id', 'created_at')[:10]:  # Show first 10
+                self.stdout.write(f"     - Response {response_id} from {created_at}")
             if count > 10:
                 self.stdout.write(f"     ... and {count - 10} more")
             return
@@ -118,79 +118,50 @@ class Command(BaseCommand):
             self.stdout.write("   Resumes directory does not exist.")
             return
         
-        # Get all files in resumes directory
+        # First pass: count orphans without accumulating file lists
+        orphaned_count = 0
+        total_size = 0
+        samples = []
+        
         try:
-            all_files = []
-            for root, dirs, files in os.walk(resumes_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, media_root)
-                    all_files.append((file_path, relative_path))
+            for file_path, relative_path, file_size in self._iter_orphaned_files(resumes_dir, media_root):
+                orphaned_count += 1
+                total_size += file_size
+                if len(samples) < 10:
+                    samples.append((relative_path, file_size))
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f"   Error reading resumes directory: {str(e)}")
             )
             return
         
-        if not all_files:
-            self.stdout.write("   No files found in resumes directory.")
-            return
-        
-        self.stdout.write(f"   Found {len(all_files)} file(s) in resumes directory")
-        
-        # Get all resume file paths from questionnaires
-        active_resume_paths = set()
-        questionnaires_with_resumes = CVQuestionnaire.objects.exclude(resume='').exclude(resume__isnull=True)
-        
-        for questionnaire in questionnaires_with_resumes:
-            if questionnaire.resume:
-                # Convert to relative path for comparison
-                resume_path = questionnaire.resume.name
-                active_resume_paths.add(resume_path)
-        
-        self.stdout.write(f"   Found {len(active_resume_paths)} active resume reference(s)")
-        
-        # Find orphaned files
-        orphaned_files = []
-        total_size = 0
-        
-        for file_path, relative_path in all_files:
-            if relative_path not in active_resume_paths:
-                try:
-                    file_size = os.path.getsize(file_path)
-                    orphaned_files.append((file_path, relative_path, file_size))
-                    total_size += file_size
-                except OSError:
-                    # File might have been deleted or is inaccessible
-                    continue
-        
-        if not orphaned_files:
+        if not orphaned_count:
             self.stdout.write("   No orphaned files found.")
             return
         
-        self.stdout.write(f"   Found {len(orphaned_files)} orphaned file(s)")
+        self.stdout.write(f"   Found {orphaned_count} orphaned file(s)")
         self.stdout.write(f"   Total size: {self._format_file_size(total_size)}")
         
         if dry_run:
             self.stdout.write("   [DRY-RUN] Would delete these orphaned files:")
-            for file_path, relative_path, file_size in orphaned_files[:10]:
+            for relative_path, file_size in samples:
                 self.stdout.write(f"     - {relative_path} ({self._format_file_size(file_size)})")
-            if len(orphaned_files) > 10:
-                self.stdout.write(f"     ... and {len(orphaned_files) - 10} more")
+            if orphaned_count > 10:
+                self.stdout.write(f"     ... and {orphaned_count - 10} more")
             return
         
         # Confirm deletion unless force is used
         if not force:
-            confirm = input(f"\nWarning: Delete {len(orphaned_files)} orphaned file(s) ({self._format_file_size(total_size)})? [y/N]: ")
+            confirm = input(f"\nWarning: Delete {orphaned_count} orphaned file(s) ({self._format_file_size(total_size)})? [y/N]: ")
             if confirm.lower() not in ['y', 'yes']:
                 self.stdout.write("   Skipped orphaned files cleanup.")
                 return
         
-        # Delete orphaned files
+        # Second pass: delete each orphan as it is visited
         deleted_count = 0
         deleted_size = 0
         
-        for file_path, relative_path, file_size in orphaned_files:
+        for file_path, relative_path, file_size in self._iter_orphaned_files(resumes_dir, media_root):
             try:
                 os.remove(file_path)
                 deleted_count += 1
@@ -211,6 +182,44 @@ class Command(BaseCommand):
         # Clean up empty directories
         self._cleanup_empty_directories(resumes_dir)
 
+    def _iter_orphaned_files(self, resumes_dir, media_root, batch_size=1000):
+        """Yield (file_path, relative_path, size) for unreferenced files under resumes_dir"""
+        # Every path under resumes_dir shares the media_root prefix, so slice
+        # it off rather than normalising each path with os.path.relpath
+        prefix_len = len(os.path.join(media_root, ''))
+        batch = []
+        for file_path, file_size in self._iter_files(resumes_dir):
+            batch.append((file_path, file_path[prefix_len:], file_size))
+            if len(batch) >= batch_size:
+                yield from self._filter_unreferenced(batch)
+                batch = []
+        if batch:
+            yield from self._filter_unreferenced(batch)
+
+    def _filter_unreferenced(self, batch):
+        """Drop files referenced by a questionnaire, checked in one indexed query per batch"""
+        referenced = set(
+            CVQuestionnaire.objects.filter(
+                resume__in=[relative_path for _, relative_path, _ in batch]
+            ).values_list('resume', flat=True)
+        )
+        for file_path, relative_path, file_size in batch:
+            if relative_path not in referenced:
+                yield file_path, relative_path, file_size
+
+    def _iter_files(self, directory):
+        """Recursively yield (file_path, size) using the stat cached on each DirEntry"""
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from self._iter_files(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    # File might have been deleted or is inaccessible
+                    continue
+
     def _cleanup_empty_directories(self, directory):
         """Remove empty directories within the resumes directory"""
         try:
@@ -218,7 +227,9 @@ class Command(BaseCommand):
                 for dir_name in dirs:
                     dir_path = os.path.join(root, dir_name)
                     try:
-                        if not os.listdir(dir_path):  # Directory is empty
+                        with os.scandir(dir_path) as entries:
+                            is_empty = next(entries, None) is None
+                        if is_empty:
                             os.rmdir(dir_path)
                             self.stdout.write(f"     Removed empty directory: {dir_path}")
                     except OSError:
@@ -234,11 +245,7 @@ class Command(BaseCommand):
             return "0 B"
         
         size_names = ["B", "KB", "MB", "GB"]
-        i = 0
-        size = float(size_bytes)
-        
-        while size >= 1024.0 and i < len(size_names) - 1:
-            size /= 1024.0
-            i += 1
+        # Each unit spans 10 bits, so the unit index falls out of the bit length
+        i = min((size_bytes.bit_length() - 1) // 10, len(size_names) - 1)
         
-        return f"{size:.1f} {size_names[i]}"
\ No newline at end of file
+        return f"{size_bytes / (1 << (i * 10)):.1f} {size_names[i]}"
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from cv.models import CVQuestionnaire, AIResponse
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -42,29 +43,35 @@ class Command(BaseCommand):
         # Create old questionnaires and AI responses
         old_date = timezone.now() - timedelta(days=100)
         
-        for i in range(count):
-            # Create questionnaire
-            questionnaire = CVQuestionnaire.objects.create(
-                user=user,
-                position=f'Test Position {i+1}',
-                industry='Technology',
-                experience_level='3-5',
-                company_size='medium',
-                location='Remote',
-                application_timeline='1-3 months',
-                job_description=f'Test job description {i+1}'
+        with transaction.atomic():
+            questionnaires = CVQuestionnaire.objects.bulk_create(
+                [
+                    CVQuestionnaire(
+                        user=user,
+                        position=f'Test Position {i+1}',
+                        industry='Technology',
+                        experience_level='3-5',
+                        company_size='medium',
+                        location='Remote',
+                        application_timeline='1-3 months',
+                        job_description=f'Test job description {i+1}'
+                    )
+                    for i in range(count)
+                ],
+                batch_size=500
             )
             
-            # Create AI response with old date
-            ai_response = AIResponse.objects.create(
-                questionnaire=questionnaire,
-                response_text=f'This is a test AI response {i+1} that should be cleaned up.'
+            AIResponse.objects.bulk_create(
+                [
+                    AIResponse(
+                        questionnaire=questionnaire,
+                        response_text=f'This is a test AI response {i+1} that should be cleaned up.',
+                        created_at=old_date
+                    )
+                    for i, questionnaire in enumerate(questionnaires)
+                ],
+                batch_size=500
             )
-            
-            # Manually update the created_at to be old
-            AIResponse.objects.filter(id=ai_response.id).update(created_at=old_date)
-            
-            self.stdout.write(f"   Created test questionnaire and AI response {i+1}")
         
         self.stdout.write(
             self.style.SUCCESS(f"Created {count} test records dated {old_date.strftime('%Y-%m-%d')}")
@@ -2,10 +2,13 @@
 
 from django.core.management.base import BaseCommand, CommandError
 from django.core.cache import cache
+from django_redis import get_redis_connection
 from django.contrib.auth import get_user_model
-from core.throttling import get_rate_limit_status
+from django.db.models import Q
+from core.throttling import get_rate_limit_status, usage_cache_key, user_plan_name
 from datetime import datetime
 import json
+import time
 
 User = get_user_model()
 
@@ -40,6 +43,12 @@ class Command(BaseCommand):
             help='Scope for rate limit actions'
         )
         
+        parser.add_argument(
+            '--yes',
+            action='store_true',
+            help='Skip the confirmation prompt for clear-all'
+        )
+        
         parser.add_argument(
             '--duration',
             type=int,
@@ -61,7 +70,18 @@ class Command(BaseCommand):
         elif action == 'list-blocked':
             self.list_blocked_ips()
         elif action == 'clear-all':
-            self.clear_all_limits()
+            self.clear_all_limits(options)
+
+    def _resolve_user(self, identifier):
+        """Find a user by username or email in one query, preferring a username match."""
+        users = list(
+            User.objects.select_related('plan')
+            .filter(Q(username=identifier) | Q(email=identifier))[:2]
+        )
+        for user in users:
+            if user.username == identifier:
+                return user
+        return users[0] if users else None
 
     def show_status(self, options):
         """Show rate limit status for a user."""
@@ -71,14 +91,10 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('--user is required for status action'))
             return
         
-        try:
-            user = User.objects.get(username=user_identifier)
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(email=user_identifier)
-            except User.DoesNotExist:
-                self.stdout.write(self.style.ERROR(f'User not found: {user_identifier}'))
-                return
+        user = self._resolve_user(user_identifier)
+        if user is None:
+            self.stdout.write(self.style.ERROR(f'User not found: {user_identifier}'))
+            return
         
         self.stdout.write(self.style.SUCCESS(f'\n📊 Rate Limit Status for {user.username}'))
         self.stdout.write(f'Plan: {user.plan.name if user.plan else "No Plan"}')
@@ -105,20 +121,17 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('--user is required for reset action'))
             return
         
-        try:
-            user = User.objects.get(username=user_identifier)
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(email=user_identifier)
-            except User.DoesNotExist:
-                self.stdout.write(self.style.ERROR(f'User not found: {user_identifier}'))
-                return
+        user = self._resolve_user(user_identifier)
+        if user is None:
+            self.stdout.write(self.style.ERROR(f'User not found: {user_identifier}'))
+            return
         
         scopes = ['ai_responses', 'questionnaires', 'api_calls'] if options['scope'] == 'all' else [options['scope']]
         
-        for scope in scopes:
-            cache_key = f'throttle_{scope}_{user.pk}'
-            cache.delete(cache_key)
+        # Same keys the throttles count under, including api_calls' current window
+        plan_name = user_plan_name(user)
+        now = time.time()
+        cache.delete_many([usage_cache_key(user, scope, plan_name, now) for scope in scopes])
         
         self.stdout.write(self.style.SUCCESS(f'✅ Rate limits reset for {user.username} (scopes: {", ".join(scopes)})'))
 
@@ -150,28 +163,46 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'✅ IP {ip_address} unblocked'))
 
     def list_blocked_ips(self):
-        """List all blocked IPs (this is tricky with Redis, showing concept)."""
-        self.stdout.write(self.style.WARNING('⚠️  Listing blocked IPs requires Redis SCAN operation'))
-        self.stdout.write('Note: This is a placeholder. Full implementation requires direct Redis access.')
-        
-        # This would require direct Redis connection to scan keys
-        # For now, just show the concept
-        self.stdout.write('\nTo list blocked IPs manually, use:')
-        self.stdout.write('  redis-cli KEYS "blocked:ip:*"')
-
-    def clear_all_limits(self):
-        """Clear all rate limit counters (use with caution)."""
-        confirm = input('⚠️  This will clear ALL rate limit counters. Are you sure? (yes/no): ')
+        """List all blocked IPs."""
+        client = get_redis_connection('default')
+        prefix = cache.make_key('blocked:ip:')
         
-        if confirm.lower() != 'yes':
-            self.stdout.write('Cancelled.')
+        blocked = sorted(
+            key.decode()[len(prefix):]
+            for key in client.scan_iter(match=f'{prefix}*', count=500)
+        )
+        
+        if not blocked:
+            self.stdout.write('No blocked IPs.')
             return
         
-        # Clear throttle keys (pattern-based deletion)
-        self.stdout.write('Clearing all rate limit counters...')
+        self.stdout.write(self.style.SUCCESS(f'\n🚫 Blocked IPs ({len(blocked)}):'))
+        for ip_address in blocked:
+            self.stdout.write(f'  {ip_address}')
+
+    def clear_all_limits(self, options):
+        """Clear all rate limit counters (use with caution)."""
+        if not options.get('yes'):
+            confirm = input('⚠️  This will clear ALL rate limit counters. Are you sure? (yes/no): ')
+            
+            if confirm.lower() != 'yes':
+                self.stdout.write('Cancelled.')
+                return
         
-        # Note: This is a simplified version
-        # Full implementation would scan and delete all throttle keys
-        cache.clear()
+        self.stdout.write('Clearing all rate limit counters...')
         
-        self.stdout.write(self.style.SUCCESS('✅ All rate limit counters cleared'))
\ No newline at end of file
+        # SCAN + UNLINK only the throttle and IP counter keys, in batches, so
+        # the rest of the cache survives and Redis is never blocked
+        client = get_redis_connection('default')
+        deleted = 0
+        for pattern in ('throttle_*', 'ratelimit:*'):
+            batch = []
+            for key in client.scan_iter(match=cache.make_key(pattern), count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += client.unlink(*batch)
+        
+        self.stdout.write(self.style.SUCCESS(f'✅ All rate limit counters cleared ({deleted} keys)'))
@@ -1,5 +1,6 @@
 # core/middleware/__init__.py
 
+from .cache_invalidation import CacheInvalidationMiddleware
 from .rate_limit import RateLimitMiddleware, RequestLoggingMiddleware
 
-__all__ = ['RateLimitMiddleware', 'RequestLoggingMiddleware']
\ No newline at end of file
+__all__ = ['CacheInvalidationMiddleware', 'RateLimitMiddleware', 'RequestLoggingMiddleware']
@@ -0,0 +1,19 @@
+# core/middleware/cache_invalidation.py
+from core.cache_utils import flush_request_invalidations, start_request_invalidations
+
+
+class CacheInvalidationMiddleware:
+    """
+    Collects the cache invalidations scheduled while handling a request and
+    runs each one once, after the view (and its transactions) has finished.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_request_invalidations()
+        try:
+            return self.get_response(request)
+        finally:
+            flush_request_invalidations()
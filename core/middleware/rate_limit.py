@@ -1,49 +1,86 @@
 # core/middleware/rate_limit.py
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
 from django.core.cache import cache
 from django.http import JsonResponse
-from django.utils import timezone
-from datetime import timedelta
+from django_redis import get_redis_connection
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Block list check and fixed-window admission, run atomically in Redis so
+# only admitted requests are counted: a client retrying after a 429, or
+# while blocked, doesn't keep raising its own counts.
+# KEYS[1]: block key; KEYS[2]: the IP's counter hash for this hour.
+# ARGV: minute field, requests per minute, requests per hour.
+# Returns {blocked, allowed, requests this minute}.
+CHECK_AND_COUNT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {1, 0, 0}
+end
+local counts = redis.call('HMGET', KEYS[2], ARGV[1], 'h')
+local minute_count = tonumber(counts[1]) or 0
+if minute_count >= tonumber(ARGV[2]) or (tonumber(counts[2]) or 0) >= tonumber(ARGV[3]) then
+    return {0, 0, minute_count}
+end
+minute_count = redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[2], 'h', 1)
+redis.call('EXPIRE', KEYS[2], 3600, 'NX')
+return {0, 1, minute_count}
+"""
+
+
+def _client_ip(request):
+    """
+    Extract client IP from request, considering proxies.
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',', 1)[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
 class RateLimitMiddleware:
     """
     Middleware for IP-based rate limiting and DDoS protection.
     This works at the middleware level before view processing.
     """
     
+    # Configurable limits
+    limits = {
+        'requests_per_minute': 60,
+        'requests_per_hour': 1000,
+        'suspicious_threshold': 100,  # requests/min triggers alert
+    }
+    
+    exempt_paths = ('/admin/', '/static/', '/media/', '/health/')
+    
     def __init__(self, get_response):
         self.get_response = get_response
-        
-        # Configurable limits
-        self.limits = {
-            'requests_per_minute': 60,
-            'requests_per_hour': 1000,
-            'suspicious_threshold': 100,  # requests/min triggers alert
-        }
+        self.check_and_count = get_redis_connection('default').register_script(CHECK_AND_COUNT_SCRIPT)
     
     def __call__(self, request):
         # Skip rate limiting for certain paths
-        exempt_paths = ['/admin/', '/static/', '/media/', '/health/']
-        if any(request.path.startswith(path) for path in exempt_paths):
+        if request.path.startswith(self.exempt_paths):
             return self.get_response(request)
         
-        # Get client IP
-        ip_address = self.get_client_ip(request)
+        # Get client IP, stashed for RequestLoggingMiddleware
+        ip_address = _client_ip(request)
+        request._client_ip = ip_address
         
-        # Check if IP is blocked
-        if self.is_ip_blocked(ip_address):
-            logger.warning(f"Blocked IP attempted access: {ip_address}")
+        # Check the block list and rate limits in one round trip
+        blocked, allowed, minute_count, reset_at = self.check_rate_limit(ip_address, request)
+        if blocked:
+            logger.warning("Blocked IP attempted access: %s", ip_address)
             return JsonResponse({
                 'error': 'access_denied',
                 'message': 'Your IP has been temporarily blocked due to suspicious activity.',
                 'contact': 'Please contact support if you believe this is an error.'
             }, status=403)
         
-        # Check rate limits
-        if not self.check_rate_limit(ip_address, request):
-            logger.warning(f"Rate limit exceeded for IP: {ip_address}")
+        if not allowed:
+            logger.warning("Rate limit exceeded for IP: %s", ip_address)
             return JsonResponse({
                 'error': 'rate_limit_exceeded',
                 'message': 'Too many requests from your IP address.',
@@ -54,74 +91,44 @@ class RateLimitMiddleware:
         response = self.get_response(request)
         
         # Add rate limit headers
-        self.add_rate_limit_headers(response, ip_address)
+        self.add_rate_limit_headers(response, minute_count, reset_at)
         
         return response
     
-    def get_client_ip(self, request):
-        """
-        Extract client IP from request, considering proxies.
-        """
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
     def check_rate_limit(self, ip_address, request):
         """
-        Check if IP has exceeded rate limits.
+        Check if IP is blocked or has exceeded rate limits.
+        Returns (blocked, allowed, requests this minute, minute window reset timestamp).
         """
-        now = timezone.now()
-        
-        # Minute-based limiting
-        minute_key = f'ratelimit:ip:{ip_address}:minute'
-        minute_requests = cache.get(minute_key, [])
+        now = int(time.time())
+        minute_window = now // 60
+        reset_at = (minute_window + 1) * 60
+        
+        # Fixed-window counters: one hash per IP per hour, holding the hour
+        # total ('h') and a field per minute ('m:<window>')
+        block_key = cache.make_key(f'blocked:ip:{ip_address}')
+        counter_key = cache.make_key(f'ratelimit:ip:{ip_address}:{now // 3600}')
+        
+        blocked, allowed, minute_count = self.check_and_count(
+            keys=[block_key, counter_key],
+            args=[
+                f'm:{minute_window}',
+                self.limits['requests_per_minute'],
+                self.limits['requests_per_hour'],
+            ],
+        )
         
-        # Clean old requests (older than 1 minute)
-        minute_requests = [
-            req_time for req_time in minute_requests 
-            if now - req_time < timedelta(minutes=1)
-        ]
+        if blocked:
+            return True, False, minute_count, reset_at
         
-        # Check minute limit
-        if len(minute_requests) >= self.limits['requests_per_minute']:
+        if not allowed:
             # Check if this is suspicious activity
-            if len(minute_requests) >= self.limits['suspicious_threshold']:
+            if minute_count >= self.limits['suspicious_threshold']:
                 self.block_ip(ip_address, duration_minutes=15)
-                logger.error(f"Suspicious activity detected from IP: {ip_address}")
-            return False
-        
-        # Hour-based limiting
-        hour_key = f'ratelimit:ip:{ip_address}:hour'
-        hour_requests = cache.get(hour_key, [])
-        
-        # Clean old requests (older than 1 hour)
-        hour_requests = [
-            req_time for req_time in hour_requests 
-            if now - req_time < timedelta(hours=1)
-        ]
-        
-        # Check hour limit
-        if len(hour_requests) >= self.limits['requests_per_hour']:
-            return False
-        
-        # Update counters
-        minute_requests.append(now)
-        hour_requests.append(now)
-        
-        cache.set(minute_key, minute_requests, 60)  # 1 minute TTL
-        cache.set(hour_key, hour_requests, 3600)   # 1 hour TTL
+                logger.error("Suspicious activity detected from IP: %s", ip_address)
+            return False, False, minute_count, reset_at
         
-        return True
-    
-    def is_ip_blocked(self, ip_address):
-        """
-        Check if IP is in the blocked list.
-        """
-        block_key = f'blocked:ip:{ip_address}'
-        return cache.get(block_key, False)
+        return False, True, minute_count, reset_at
     
     def block_ip(self, ip_address, duration_minutes=15):
         """
@@ -131,28 +138,22 @@ class RateLimitMiddleware:
         cache.set(block_key, True, duration_minutes * 60)
         
         logger.warning(
-            f"IP blocked for {duration_minutes} minutes: {ip_address}",
+            "IP blocked for %s minutes: %s", duration_minutes, ip_address,
             extra={'ip_address': ip_address, 'duration_minutes': duration_minutes}
         )
     
-    def add_rate_limit_headers(self, response, ip_address):
+    def add_rate_limit_headers(self, response, minute_count, reset_at):
         """
         Add rate limit information to response headers.
         """
-        minute_key = f'ratelimit:ip:{ip_address}:minute'
-        minute_requests = cache.get(minute_key, [])
-        
-        now = timezone.now()
-        minute_requests = [
-            req_time for req_time in minute_requests 
-            if now - req_time < timedelta(minutes=1)
-        ]
+        if not getattr(settings, 'RATE_LIMIT_EMIT_HEADERS', True):
+            return response
         
-        remaining = max(0, self.limits['requests_per_minute'] - len(minute_requests))
+        remaining = max(0, self.limits['requests_per_minute'] - minute_count)
         
         response['X-RateLimit-Limit'] = str(self.limits['requests_per_minute'])
         response['X-RateLimit-Remaining'] = str(remaining)
-        response['X-RateLimit-Reset'] = str(int((now + timedelta(minutes=1)).timestamp()))
+        response['X-RateLimit-Reset'] = str(reset_at)
         
         return response
 
@@ -162,27 +163,26 @@ class RequestLoggingMiddleware:
     Log all API requests for monitoring and debugging.
     """
     
+    skip_paths = ('/static/', '/media/', '/admin/jsi18n/')
+    
     def __init__(self, get_response):
         self.get_response = get_response
     
     def __call__(self, request):
-        # Skip logging for certain paths
-        skip_paths = ['/static/', '/media/', '/admin/jsi18n/']
-        if any(request.path.startswith(path) for path in skip_paths):
+        # Skip logging for certain paths, or entirely when INFO is disabled
+        if request.path.startswith(self.skip_paths) or not logger.isEnabledFor(logging.INFO):
             return self.get_response(request)
         
-        # Get client IP
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR')
+        # Get client IP (already resolved if RateLimitMiddleware ran)
+        ip = getattr(request, '_client_ip', None) or _client_ip(request)
         
         # Log request
-        user_id = request.user.id if request.user.is_authenticated else 'anonymous'
+        # Read the id from the session rather than loading the User row
+        session = getattr(request, 'session', None)
+        user_id = session.get(SESSION_KEY, 'anonymous') if session is not None else 'anonymous'
         
         logger.info(
-            f"API Request: {request.method} {request.path}",
+            "API Request: %s %s", request.method, request.path,
             extra={
                 'method': request.method,
                 'path': request.path,
@@ -196,7 +196,7 @@ class RequestLoggingMiddleware:
         
         # Log response
         logger.info(
-            f"API Response: {request.method} {request.path} - {response.status_code}",
+            "API Response: %s %s - %s", request.method, request.path, response.status_code,
             extra={
                 'method': request.method,
                 'path': request.path,
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_plan_status_idx',
+        ),
+        migrations.AlterField(
+            model_name='plan',
+            name='order',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='stripe_subscription_status',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
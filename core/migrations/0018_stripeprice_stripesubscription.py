@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_drop_low_selectivity_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('unit_amount', models.PositiveIntegerField(default=0)),
+                ('currency', models.CharField(max_length=3)),
+                ('recurring_interval', models.CharField(blank=True, max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StripeSubscription',
+            fields=[
+                ('id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('current_period_end', models.PositiveBigIntegerField()),
+                ('recurring_interval', models.CharField(blank=True, max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
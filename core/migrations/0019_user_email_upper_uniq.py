@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 09:12
+
+import django.db.models.functions.text
+from django.core.management.base import CommandError
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def check_email_case_clashes(apps, schema_editor):
+    """
+    Stop before adding the constraint if existing emails differ only in case,
+    listing them so they can be merged or corrected by hand.
+    """
+    User = apps.get_model('core', 'User')
+    clashing = (
+        User.objects.annotate(email_upper=Upper('email'))
+        .values('email_upper')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values('email_upper')
+    )
+    emails = list(
+        User.objects.annotate(email_upper=Upper('email'))
+        .filter(email_upper__in=clashing)
+        .order_by('email_upper', 'email')
+        .values_list('email', flat=True)
+    )
+    if emails:
+        raise CommandError(
+            'Cannot add user_email_upper_uniq: these emails differ only in case. '
+            'Merge or correct the accounts, then migrate again:\n  ' + '\n  '.join(emails)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_stripeprice_stripesubscription'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_case_clashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('email'), name='user_email_upper_uniq'),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models.functions import Upper
+from .cache_utils import get_plans_version
 from .validators import validate_email_with_suggestions
 
 class User(AbstractUser):
     date_of_birth = models.DateField(blank=True, null=True)
     plan = models.ForeignKey('Plan', on_delete=models.SET_NULL, null=True, blank=True, related_name='users', db_index=True)
     stripe_subscription_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
-    stripe_subscription_status = models.CharField(max_length=50, blank=True, null=True, db_index=True)
+    stripe_subscription_status = models.CharField(max_length=50, blank=True, null=True)
     stripe_customer_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     email = models.EmailField('email address', blank=False, null=False, unique=True, validators=[validate_email_with_suggestions])
 
@@ -18,19 +21,22 @@ class User(AbstractUser):
             models.Index(fields=['email'], name='user_email_idx'),
             models.Index(fields=['username'], name='user_username_idx'),
             models.Index(fields=['date_joined'], name='user_date_joined_idx'),
-            models.Index(fields=['plan', 'stripe_subscription_status'], name='user_plan_status_idx'),
             models.Index(fields=['stripe_customer_id'], name='user_stripe_customer_idx'),
+            # Back the admin search: icontains on username (iexact on email uses user_email_upper_uniq)
+            GinIndex(fields=['username'], name='user_username_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+        constraints = [
+            # Emails differing only in case belong to the same person; the
+            # UPPER() index also serves every email__iexact lookup
+            models.UniqueConstraint(Upper('email'), name='user_email_upper_uniq'),
         ]
 
     def __str__(self):
         return f"{self.username} ({self.email})"
     
     def save(self, *args, **kwargs):
-        if self._state.adding and not self.plan:
-            try:
-                self.plan = Plan.objects.get(name='Free')
-            except Plan.DoesNotExist:
-                pass
+        if self._state.adding and not self.plan_id:
+            self.plan_id = get_free_plan_id()
         super().save(*args, **kwargs)
 
 class Plan(models.Model):
@@ -39,7 +45,7 @@ class Plan(models.Model):
     stripe_price_id_yearly = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    order = models.PositiveIntegerField(default=10, db_index=True)
+    order = models.PositiveIntegerField(default=10)
 
     class Meta:
         ordering = ['order', 'name']
@@ -48,4 +54,118 @@ class Plan(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.name} Plan"
\ No newline at end of file
+        return f"{self.name} Plan"
+
+
+class StripePrice(models.Model):
+    """
+    Local copy of a Stripe Price, kept current by StripeWebhookView so
+    serializers don't call the Stripe API.
+    """
+    id = models.CharField(max_length=100, primary_key=True)
+    unit_amount = models.PositiveIntegerField(default=0)
+    currency = models.CharField(max_length=3)
+    recurring_interval = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.id
+
+    @classmethod
+    def sync(cls, price):
+        """Create or update the copy from a Stripe Price object or event payload."""
+        recurring = price.get('recurring') or {}
+        obj, _ = cls.objects.update_or_create(
+            id=price['id'],
+            defaults={
+                'unit_amount': price.get('unit_amount') or 0,
+                'currency': price.get('currency') or '',
+                'recurring_interval': recurring.get('interval') or '',
+            },
+        )
+        return obj
+
+    def as_price_details(self):
+        return {
+            'amount': self.unit_amount / 100,
+            'currency': self.currency.upper(),
+            'interval': self.recurring_interval,
+        }
+
+
+class StripeSubscription(models.Model):
+    """
+    Local copy of a Stripe Subscription, kept current by StripeWebhookView.
+    """
+    id = models.CharField(max_length=255, primary_key=True)
+    status = models.CharField(max_length=50, blank=True)
+    current_period_end = models.PositiveBigIntegerField()  # Unix timestamp, as sent by Stripe
+    recurring_interval = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.id
+
+    @classmethod
+    def sync(cls, subscription):
+        """Create or update the copy from a Stripe Subscription object or event payload."""
+        item = subscription['items']['data'][0]
+        obj, _ = cls.objects.update_or_create(
+            id=subscription['id'],
+            defaults={
+                'status': subscription.get('status') or '',
+                # Newer API versions only report the period on the items
+                'current_period_end': item.get('current_period_end') or subscription.get('current_period_end'),
+                'recurring_interval': item['price']['recurring']['interval'],
+            },
+        )
+        return obj
+
+
+# (plans version, id) of the Free plan
+_free_plan = (None, None)
+
+
+def get_free_plan_id():
+    """
+    Id of the default Free plan, memoized per process for the current plans
+    version. The Plan signals bump that version after commit, so every
+    process looks the id up again once the Free plan is renamed or deleted;
+    clear_free_plan_id() also drops it at once in this process.
+    """
+    global _free_plan
+    version = get_plans_version()
+    if _free_plan[0] != version:
+        _free_plan = (version, Plan.objects.filter(name='Free').values_list('id', flat=True).first())
+    return _free_plan[1]
+
+
+def clear_free_plan_id():
+    global _free_plan
+    _free_plan = (None, None)
+
+
+# (plans version, id -> name map of every plan)
+_plan_names = (None, {})
+
+
+def get_plan_name(plan_id):
+    """
+    Name of the plan with ``plan_id``, from a per-process id -> name map, so
+    callers that only hold user.plan_id don't load the Plan row.
+    Like get_free_plan_id, the map is kept for the current plans version, so
+    every process reloads it once a plan is renamed; an unknown id reloads it
+    too. Returns None for a missing plan_id without touching the database.
+    """
+    global _plan_names
+    if not plan_id:
+        return None
+    version = get_plans_version()
+    if _plan_names[0] != version or plan_id not in _plan_names[1]:
+        _plan_names = (version, dict(Plan.objects.values_list('id', 'name')))
+    return _plan_names[1].get(plan_id)
+
+
+def clear_plan_names():
+    global _plan_names
+    _plan_names = (None, {})
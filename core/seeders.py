@@ -1,4 +1,5 @@
-from .models import Plan
+from .cache_utils import bump_plans_version
+from .models import Plan, clear_free_plan_id, clear_plan_names
 
 def seed_plans():
     plans = [
@@ -28,16 +29,20 @@ def seed_plans():
         },
     ]
 
-    for p in plans:
-        plan, created = Plan.objects.get_or_create(
-            name=p['name'],
-            defaults={
-                'stripe_price_id_monthly': p['stripe_price_id_monthly'],
-                'stripe_price_id_yearly': p['stripe_price_id_yearly'],
-            }
-        )
+    existing = set(Plan.objects.filter(name__in=[p['name'] for p in plans]).values_list('name', flat=True))
+    missing = [Plan(**p) for p in plans if p['name'] not in existing]
+
+    # Single INSERT; ignore_conflicts covers a concurrent seed racing on name
+    Plan.objects.bulk_create(missing, ignore_conflicts=True)
 
-        if created:
-            print(f"✅ Created plan: {plan.name}")
+    if missing:
+        # bulk_create skips post_save, so invalidate plan caches here
+        bump_plans_version()
+        clear_free_plan_id()
+        clear_plan_names()
+
+    for p in plans:
+        if p['name'] in existing:
+            print(f"⏩ Plan '{p['name']}' already exists. Skipping.")
         else:
-            print(f"⏩ Plan '{plan.name}' already exists. Skipping.")
\ No newline at end of file
+            print(f"✅ Created plan: {p['name']}")
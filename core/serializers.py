@@ -1,21 +1,54 @@
 from rest_framework import serializers
-from .models import User, Plan
+from .models import User, Plan, StripePrice, StripeSubscription
 from dj_rest_auth.serializers import UserDetailsSerializer
 from .validators import validate_email_with_suggestions
 from django.core.exceptions import ValidationError as DjangoValidationError
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from django.conf import settings
 from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.manager import BaseManager
+from .cache_utils import LocalTTLCache, jittered_ttl
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import time
 
 import stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Long-lived: StripeWebhookView drops these entries when Stripe reports a change
+STRIPE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Shown for a billing period a plan doesn't offer. Shared, so never mutate it
+NO_PRICE_DETAILS = {
+    "amount": 0,
+    "currency": "USD",
+    "interval": 'None'
+}
+
+# Upper bound on concurrent Stripe requests while filling a plan list
+STRIPE_FETCH_WORKERS = 8
+
+# Subscription info TTL by Stripe status: states that are about to change
+# (failed payments, incomplete checkouts) are re-checked within minutes
+SUBSCRIPTION_CACHE_TIMEOUTS = {
+    'active': 60 * 60 * 6,
+    'trialing': 60 * 60,
+    'past_due': 60 * 5,
+    'incomplete': 60 * 5,
+    'unpaid': 60 * 5,
+}
+
 class PlanSerializer(serializers.ModelSerializer):
     monthly_price = serializers.SerializerMethodField()
     yearly_price = serializers.SerializerMethodField()
     is_current = serializers.SerializerMethodField()
 
+    # In-process layer in front of the Redis price cache; kept short so a
+    # price change reaches every worker within a few minutes
+    local_price_cache = LocalTTLCache(ttl=60 * 5)
+
     class Meta:
         model = Plan
         fields = ['id', 'name', 'description', 'monthly_price', 'yearly_price', 'is_current']
@@ -28,38 +61,122 @@ class PlanSerializer(serializers.ModelSerializer):
 
     def get_price_details(self, price_id):
         if not price_id:
-            return {
-                "amount": 0,
-                "currency": "USD",
-                "interval": 'None'
-            }
+            return NO_PRICE_DETAILS
+
+        # Prices resolved up front for a whole list (see load_price_details)
+        price_details = self.context.get('price_details')
+        if price_details is not None and price_id in price_details:
+            return price_details[price_id]
+
+        local = self.local_price_cache.get(price_id)
+        if local is not None:
+            return local
 
         cache_key = f'stripe_price_{price_id}'
         cached = cache.get(cache_key)
         if cached:
+            self.local_price_cache.set(price_id, cached)
             return cached
 
+        data = self._fetch_price_details(price_id)
+        if data is not None:
+            cache.set(cache_key, data, timeout=jittered_ttl(STRIPE_CACHE_TIMEOUT))
+            self.local_price_cache.set(price_id, data)
+        return data
+
+    @classmethod
+    def _fetch_price_details(cls, price_id):
+        mirrored = StripePrice.objects.filter(id=price_id).first()
+        if mirrored is not None:
+            return mirrored.as_price_details()
+        price = cls._retrieve_price(price_id)
+        if price is None:
+            return None
+        return StripePrice.sync(price).as_price_details()
+
+    @staticmethod
+    def _retrieve_price(price_id):
+        # Only for prices the webhooks haven't mirrored yet
         try:
-            price = stripe.Price.retrieve(price_id)
-            data = {
-                'amount': price.unit_amount / 100,
-                'currency': price.currency.upper(),
-                'interval': price.recurring.interval,
-            }
-            cache.set(cache_key, data, timeout=60 * 120)
-            return data
+            return stripe.Price.retrieve(price_id)
         except Exception:
             return None
+
+    @classmethod
+    def load_price_details(cls, plans):
+        """
+        Resolve the prices of all given plans with a single cache read,
+        calling Stripe only for the misses. Pass the result to the serializer
+        as context['price_details'].
+
+        The process-local layer is written but never read here: the result
+        is cached for the whole plan list TTL, and a list rebuild usually
+        follows a price webhook that other workers' local copies haven't seen.
+        """
+        price_ids = {
+            price_id
+            for plan in plans
+            for price_id in (plan.stripe_price_id_monthly, plan.stripe_price_id_yearly)
+            if price_id
+        }
+        price_details = {}
+
+        cache_keys = {f'stripe_price_{price_id}': price_id for price_id in price_ids}
+        if cache_keys:
+            for key, data in cache.get_many(cache_keys).items():
+                if data:
+                    price_details[cache_keys[key]] = data
+                    cls.local_price_cache.set(cache_keys[key], data)
+
+        fetched = {}
+        missing = price_ids - price_details.keys()
+        if missing:
+            for mirrored in StripePrice.objects.filter(id__in=missing):
+                data = mirrored.as_price_details()
+                price_details[mirrored.id] = data
+                fetched[f'stripe_price_{mirrored.id}'] = data
+                cls.local_price_cache.set(mirrored.id, data)
+
+        missing = list(price_ids - price_details.keys())
+        if len(missing) > 1:
+            # Stripe retrieves are independent HTTPS calls; overlap them so a
+            # cold list costs about one round trip instead of one per price
+            with ThreadPoolExecutor(max_workers=min(len(missing), STRIPE_FETCH_WORKERS)) as executor:
+                prices = list(executor.map(cls._retrieve_price, missing))
+        else:
+            prices = [cls._retrieve_price(price_id) for price_id in missing]
+        for price_id, price in zip(missing, prices):
+            # Mirrored here rather than in the worker threads, which have no DB connection of their own
+            data = StripePrice.sync(price).as_price_details() if price is not None else None
+            price_details[price_id] = data
+            if data is not None:
+                fetched[f'stripe_price_{price_id}'] = data
+                cls.local_price_cache.set(price_id, data)
+        if fetched:
+            cache.set_many(fetched, timeout=jittered_ttl(STRIPE_CACHE_TIMEOUT))
+
+        return price_details
         
     def get_is_current(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated and user.plan_id == obj.id:
-            return True
-        return False
+        # PlanListView passes the user's plan id in; other callers resolve it
+        # on first use and share it through the context for the rest of the request
+        if 'user_plan_id' not in self.context:
+            user = self.context['request'].user
+            self.context['user_plan_id'] = user.plan_id if user.is_authenticated else None
+        return self.context['user_plan_id'] == obj.id
 
 import logging
 logger = logging.getLogger(__name__)
 
+
+class CustomUserDetailsListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # One query for all the plans, whatever queryset the caller passed
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        prefetch_related_objects(users, 'plan')
+        return super().to_representation(users)
+
+
 class CustomUserDetailsSerializer(UserDetailsSerializer):
     email = serializers.EmailField(required=False)
     date_of_birth = serializers.DateField(required=False, allow_null=True)
@@ -81,40 +198,78 @@ class CustomUserDetailsSerializer(UserDetailsSerializer):
             'subscription_renewal_date',
             'subscription_interval',            
         )
+        list_serializer_class = CustomUserDetailsListSerializer
+
+    def to_representation(self, instance):
+        # No-op when the caller already used select_related('plan')
+        prefetch_related_objects([instance], 'plan')
+        return super().to_representation(instance)
 
     def _get_subscription_info(self, obj):
-        if not obj.stripe_subscription_id:
-            return None
+        # Both subscription fields need the same info; resolve it once per
+        # serializer so a cache miss doesn't reach Stripe twice
+        memo = self.__dict__.setdefault('_subscription_info', {})
+        if obj.stripe_subscription_id not in memo:
+            memo[obj.stripe_subscription_id] = self._load_subscription_info(obj)
+        return memo[obj.stripe_subscription_id]
 
+    def _load_subscription_info(self, obj):
         cache_key = f"stripe_subscription_info_{obj.stripe_subscription_id}"
         cached_info = cache.get(cache_key)
         if cached_info:
             return cached_info
 
         try:
-            subscription = stripe.Subscription.retrieve(obj.stripe_subscription_id)
-            item = subscription["items"]["data"][0]
-
-            current_period_end = item["current_period_end"]
-            interval = item["price"]["recurring"]["interval"]
+            mirrored = StripeSubscription.objects.filter(id=obj.stripe_subscription_id).first()
+            if mirrored is None:
+                # Not seen by the webhooks yet; fetch once and keep a copy
+                mirrored = StripeSubscription.sync(stripe.Subscription.retrieve(obj.stripe_subscription_id))
 
-            dt = datetime.fromtimestamp(current_period_end)
+            dt = datetime.fromtimestamp(mirrored.current_period_end)
             info = {
                 "renewal_date": dt,
-                "interval": interval
+                "interval": mirrored.recurring_interval
             }
 
-            cache.set(cache_key, info, timeout=60 * 120)
+            cache.set(cache_key, info, timeout=self._subscription_cache_timeout(
+                mirrored.status, mirrored.current_period_end
+            ))
             return info
         except Exception as e:
             logger.error(f"❌ Error fetching subscription info: {e}")
             return None        
 
+    @staticmethod
+    def _subscription_cache_timeout(status, current_period_end):
+        """Cache stable subscriptions for longer, but never past the renewal date."""
+        timeout = jittered_ttl(SUBSCRIPTION_CACHE_TIMEOUTS.get(status, 60 * 60))
+        seconds_to_renewal = int(current_period_end - time.time())
+        return max(60, min(timeout, seconds_to_renewal))
+
+    def update(self, instance, validated_data):
+        # Two concurrent requests can both pass validate_email; the
+        # user_email_upper_uniq constraint lets only one of them through
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            # validate_email passed, so only a concurrent signup/update can have
+            # taken the address; anything else is a genuine integrity error
+            email = validated_data.get('email')
+            if not email or not User.objects.filter(email__iexact=email).exclude(pk=instance.pk).exists():
+                raise
+            raise serializers.ValidationError({'email': ["A user with this email address already exists."]})
+
     def get_subscription_renewal_date(self, obj):
+        # Users without a subscription (most free-tier users) skip the lookup entirely
+        if not obj.stripe_subscription_id:
+            return None
         info = self._get_subscription_info(obj)
         return info["renewal_date"] if info else None
 
     def get_subscription_interval(self, obj):
+        if not obj.stripe_subscription_id:
+            return None
         info = self._get_subscription_info(obj)
         return info["interval"] if info else None
     
@@ -125,15 +280,16 @@ class CustomUserDetailsSerializer(UserDetailsSerializer):
                 # Use our enhanced email validator
                 validated_email = validate_email_with_suggestions(value)
                 
+                # An update that resends the user's own email can't collide with anyone
+                if self.instance and self.instance.email.lower() == value.lower():
+                    return validated_email
+
                 # Check if email already exists for other users (excluding current user if updating)
+                others = User.objects.filter(email__iexact=value)
                 if self.instance:
-                    # Updating existing user - exclude current user from uniqueness check
-                    if User.objects.filter(email=value).exclude(pk=self.instance.pk).exists():
-                        raise serializers.ValidationError("A user with this email address already exists.")
-                else:
-                    # Creating new user - check if email exists
-                    if User.objects.filter(email=value).exists():
-                        raise serializers.ValidationError("A user with this email address already exists.")
+                    others = others.exclude(pk=self.instance.pk)
+                if others.exists():
+                    raise serializers.ValidationError("A user with this email address already exists.")
                 
                 return validated_email
             except DjangoValidationError as e:
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_utils import bump_plans_version, invalidate_on_commit
+from .models import Plan, clear_free_plan_id, clear_plan_names
+
+
+def invalidate_plans():
+    bump_plans_version()
+    # A concurrent request may have reloaded the old rows into this
+    # process's memos before the commit; drop them again
+    clear_free_plan_id()
+    clear_plan_names()
+
+
+@receiver([post_save, post_delete], sender=Plan)
+def invalidate_plans_cache(sender, **kwargs):
+    # Bump after commit, so the save doesn't wait on Redis and a concurrent
+    # request can't re-cache the old rows under the new version
+    invalidate_on_commit(invalidate_plans)
+    # This process reads its own changes before the commit too
+    clear_free_plan_id()
+    clear_plan_names()
@@ -0,0 +1,98 @@
+# core/tasks.py
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from redis import ConnectionPool, Redis
+from openai import OpenAI
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_CACHE_KEY = 'health_check_status'
+# A few beat intervals, so one late run doesn't empty the cache
+HEALTH_CHECK_TIMEOUT = 30
+
+# Shared by every probe so a health check reuses an open socket instead of
+# connecting (and authenticating) again; connections are made lazily
+_redis_pool = ConnectionPool.from_url(settings.CACHE_URL)
+_redis_client = Redis(connection_pool=_redis_pool)
+
+
+def _probe_db():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        logger.debug("✅ Database health check: healthy")
+        return 'healthy'
+    except Exception as e:
+        logger.error(f"DB health check failed: {e}")
+        return 'unhealthy'
+
+
+def _probe_redis():
+    try:
+        _redis_client.ping()
+        logger.debug("✅ Redis health check: healthy")
+        return 'healthy'
+    except Exception as e:
+        logger.error(f"Redis health check failed: {e}")
+        return 'unhealthy'
+
+
+def _probe_openai():
+    # Optional: only checked when a key is configured
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key or getattr(settings, 'HEALTH_CHECK_SKIP_OPENAI', False):
+        return 'skipped'
+    try:
+        client = OpenAI(api_key=api_key)
+        client.models.list()  # Lightweight check
+        logger.debug("✅ OpenAI health check: healthy")
+        return 'healthy'
+    except Exception as e:
+        logger.error(f"OpenAI health check failed: {e}")
+        return 'unhealthy'
+
+
+def run_health_checks():
+    """
+    Probe the database, Redis and (if configured) OpenAI.
+    Returns the HealthCheckView payload.
+    """
+    # Redis and OpenAI are probed on worker threads while the DB probe runs
+    # here, on this thread's own connection; the total is the slowest probe
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        redis_status = executor.submit(_probe_redis)
+        openai_status = executor.submit(_probe_openai)
+        services = {
+            'db': _probe_db(),
+            'redis': redis_status.result(),
+            'openai': openai_status.result(),
+        }
+
+    # Determine overall status
+    overall = 'healthy' if services['db'] == 'healthy' and services['redis'] == 'healthy' else 'unhealthy'
+
+    return {
+        'overall': overall,
+        'services': services
+    }
+
+
+@shared_task
+def refresh_health_check():
+    """
+    Run the health probes and publish the result for HealthCheckView.
+    Scheduled by CELERY_BEAT_SCHEDULE.
+    """
+    health = run_health_checks()
+    try:
+        cache.set(HEALTH_CHECK_CACHE_KEY, health, timeout=HEALTH_CHECK_TIMEOUT)
+    except Exception as e:
+        # Redis being down is already reported in the payload
+        logger.error(f"Failed to cache health check status: {e}")
+    return health
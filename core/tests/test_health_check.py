@@ -1,39 +1,48 @@
-from django.test import TestCase
 from rest_framework.test import APITestCase
 from rest_framework import status
 from unittest.mock import patch, MagicMock
-from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
 import os
 
-from core.views import HealthCheckView
+from core.tasks import HEALTH_CHECK_CACHE_KEY
 
 
+# Every probe is mocked here, so the OpenAI one can run under the test suite
+@override_settings(HEALTH_CHECK_SKIP_OPENAI=False)
 class HealthCheckViewTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Patched once for the class; setUp puts every probe back to healthy
+        patchers = {
+            'cursor': patch('core.tasks.connection.cursor'),
+            'redis': patch('core.tasks._redis_client.ping'),
+            'openai': patch('core.tasks.OpenAI'),
+        }
+        for name, patcher in patchers.items():
+            setattr(cls, f'mock_{name}', patcher.start())
+            cls.addClassCleanup(patcher.stop)
+
     def setUp(self):
         self.url = '/core/health/'
+        cache.delete(HEALTH_CHECK_CACHE_KEY)
         # Ensure no OpenAI key for some tests
         if 'OPENAI_API_KEY' in os.environ:
             del os.environ['OPENAI_API_KEY']
 
-    @patch('core.views.connection.cursor')
-    @patch('core.views.Redis.from_url')
-    @patch('core.views.OpenAI')
-    def test_health_check_all_healthy(self, mock_openai, mock_redis, mock_cursor):
-        # Mock DB success
-        mock_cursor_instance = MagicMock()
-        mock_cursor.return_value.__enter__.return_value = mock_cursor_instance
-        mock_cursor_instance.execute.return_value = None
-
-        # Mock Redis success
-        mock_redis_instance = MagicMock()
-        mock_redis_instance.ping.return_value = True
-        mock_redis.return_value = mock_redis_instance
-
-        # Mock OpenAI success (key set)
+        for mock in (self.mock_cursor, self.mock_redis, self.mock_openai):
+            mock.reset_mock(return_value=True, side_effect=True)
+
+        # DB success
+        self.mock_cursor.return_value.__enter__.return_value.execute.return_value = None
+        # Redis success
+        self.mock_redis.return_value = True
+        # OpenAI success (when a key is set)
+        self.mock_openai.return_value.models.list.return_value = MagicMock()
+
+    def test_health_check_all_healthy(self):
         os.environ['OPENAI_API_KEY'] = 'test-key'
-        mock_client = MagicMock()
-        mock_client.models.list.return_value = MagicMock()
-        mock_openai.return_value = mock_client
 
         response = self.client.get(self.url)
 
@@ -44,22 +53,7 @@ class HealthCheckViewTest(APITestCase):
         self.assertEqual(data['services']['redis'], 'healthy')
         self.assertEqual(data['services']['openai'], 'healthy')
 
-    @patch('core.views.connection.cursor')
-    @patch('core.views.Redis.from_url')
-    def test_health_check_openai_skipped(self, mock_redis, mock_cursor):
-        # Mock DB and Redis success
-        mock_cursor_instance = MagicMock()
-        mock_cursor.return_value.__enter__.return_value = mock_cursor_instance
-        mock_cursor_instance.execute.return_value = None
-
-        mock_redis_instance = MagicMock()
-        mock_redis_instance.ping.return_value = True
-        mock_redis.return_value = mock_redis_instance
-
-        # No OpenAI key
-        if 'OPENAI_API_KEY' in os.environ:
-            del os.environ['OPENAI_API_KEY']
-
+    def test_health_check_openai_skipped(self):
         response = self.client.get(self.url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -68,23 +62,11 @@ class HealthCheckViewTest(APITestCase):
         self.assertEqual(data['services']['db'], 'healthy')
         self.assertEqual(data['services']['redis'], 'healthy')
         self.assertEqual(data['services']['openai'], 'skipped')
+        self.mock_openai.assert_not_called()
 
-    @patch('core.views.connection.cursor')
-    @patch('core.views.Redis.from_url')
-    @patch('core.views.OpenAI')
-    def test_health_check_openai_unhealthy(self, mock_openai, mock_redis, mock_cursor):
-        # Mock DB and Redis success
-        mock_cursor_instance = MagicMock()
-        mock_cursor.return_value.__enter__.return_value = mock_cursor_instance
-        mock_cursor_instance.execute.return_value = None
-
-        mock_redis_instance = MagicMock()
-        mock_redis_instance.ping.return_value = True
-        mock_redis.return_value = mock_redis_instance
-
-        # Mock OpenAI failure
+    def test_health_check_openai_unhealthy(self):
         os.environ['OPENAI_API_KEY'] = 'test-key'
-        mock_openai.side_effect = Exception('API error')
+        self.mock_openai.side_effect = Exception('API error')
 
         response = self.client.get(self.url)
 
@@ -95,16 +77,8 @@ class HealthCheckViewTest(APITestCase):
         self.assertEqual(data['services']['redis'], 'healthy')
         self.assertEqual(data['services']['openai'], 'unhealthy')
 
-    @patch('core.views.connection.cursor')
-    @patch('core.views.Redis.from_url')
-    def test_health_check_db_unhealthy(self, mock_redis, mock_cursor):
-        # Mock DB failure
-        mock_cursor.side_effect = Exception('DB error')
-
-        # Mock Redis success
-        mock_redis_instance = MagicMock()
-        mock_redis_instance.ping.return_value = True
-        mock_redis.return_value = mock_redis_instance
+    def test_health_check_db_unhealthy(self):
+        self.mock_cursor.side_effect = Exception('DB error')
 
         response = self.client.get(self.url)
 
@@ -113,16 +87,8 @@ class HealthCheckViewTest(APITestCase):
         self.assertEqual(data['overall'], 'unhealthy')
         self.assertEqual(data['services']['db'], 'unhealthy')
 
-    @patch('core.views.connection.cursor')
-    @patch('core.views.Redis.from_url')
-    def test_health_check_redis_unhealthy(self, mock_redis, mock_cursor):
-        # Mock DB success
-        mock_cursor_instance = MagicMock()
-        mock_cursor.return_value.__enter__.return_value = mock_cursor_instance
-        mock_cursor_instance.execute.return_value = None
-
-        # Mock Redis failure
-        mock_redis.side_effect = Exception('Redis error')
+    def test_health_check_redis_unhealthy(self):
+        self.mock_redis.side_effect = Exception('Redis error')
 
         response = self.client.get(self.url)
 
@@ -130,3 +96,26 @@ class HealthCheckViewTest(APITestCase):
         data = response.json()
         self.assertEqual(data['overall'], 'unhealthy')
         self.assertEqual(data['services']['redis'], 'unhealthy')
+
+    def test_health_check_served_from_cache(self):
+        cache.set(HEALTH_CHECK_CACHE_KEY, {
+            'overall': 'unhealthy',
+            'services': {'db': 'unhealthy', 'redis': 'healthy', 'openai': 'skipped'},
+        })
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['services']['db'], 'unhealthy')
+        self.mock_cursor.assert_not_called()
+
+    @override_settings(HEALTH_CHECK_SKIP_OPENAI=True)
+    def test_health_check_openai_skipped_by_setting(self):
+        os.environ['OPENAI_API_KEY'] = 'test-key'
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['services']['openai'], 'skipped')
+        self.mock_openai.assert_not_called()
@@ -0,0 +1,323 @@
+import copy
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APITestCase
+
+from core.cache_utils import (
+    bump_plans_version,
+    flush_request_invalidations,
+    get_or_set_single_flight,
+    get_plans_version,
+    invalidate_on_commit,
+    plans_list_cache_key,
+    plans_list_response_cache_key,
+    start_request_invalidations,
+)
+from core.models import Plan, StripePrice, StripeSubscription, get_free_plan_id
+from core.serializers import PlanSerializer
+
+User = get_user_model()
+
+
+class IsolatedCacheMixin:
+    """
+    Give each test its own cache key prefix instead of flushing the whole
+    cache (FLUSHDB on Redis) in setUp and tearDown.
+    """
+
+    def setUp(self):
+        super().setUp()
+        caches = copy.deepcopy(settings.CACHES)
+        caches['default']['KEY_PREFIX'] = f'test_{uuid4().hex}'
+        override = override_settings(CACHES=caches)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Runs before the override is disabled; only touches this test's keys
+        self.addCleanup(cache.delete_pattern, '*')
+
+
+def stripe_price(price_id, unit_amount, interval):
+    return {'id': price_id, 'unit_amount': unit_amount, 'currency': 'usd', 'recurring': {'interval': interval}}
+
+
+class PlanListCacheTest(IsolatedCacheMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.free_plan = Plan.objects.create(name='Free', order=1)
+        cls.pro_plan = Plan.objects.create(name='Pro', order=3)
+
+    def setUp(self):
+        super().setUp()
+        self.url = '/core/plans/'
+
+    def test_plan_list_served_from_cache(self):
+        self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([plan['name'] for plan in response.json()], ['Free', 'Pro'])
+        # Hits are answered with the stored body as-is
+        raw_key = plans_list_response_cache_key(plans_list_cache_key('all'), None)
+        self.assertEqual(cache.get(raw_key), response.content)
+
+    def test_unchanged_plan_list_returns_304(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Another user's is_current differs, so the tag must not match
+        user = User.objects.create_user(
+            username='etaguser',
+            email='etaguser@gmail.com',
+            password='testpass123',
+            plan=self.pro_plan
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_plan_list_varies_on_the_user(self):
+        miss = self.client.get(self.url)
+        hit = self.client.get(self.url)
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=miss['ETag'])
+
+        for response in (miss, hit, not_modified):
+            vary = {header.strip() for header in response['Vary'].split(',')}
+            self.assertLessEqual({'Authorization', 'Cookie'}, vary)
+        # Misses are rendered by DRF; only hits serve the stored body
+        self.assertIsInstance(miss, Response)
+        self.assertEqual(hit.content, miss.content)
+
+    def test_plan_change_invalidates_cached_list(self):
+        version = get_plans_version()
+        self.client.get(self.url)
+
+        self.pro_plan.description = 'Updated'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pro_plan.save()
+
+        self.assertGreater(get_plans_version(), version)
+        response = self.client.get(self.url)
+        pro = next(plan for plan in response.json() if plan['name'] == 'Pro')
+        self.assertEqual(pro['description'], 'Updated')
+
+    def test_plan_version_bumped_only_after_commit(self):
+        version = get_plans_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.pro_plan.save()
+            self.assertEqual(get_plans_version(), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_plans_version(), version)
+
+    def test_plan_delete_invalidates_cached_list(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pro_plan.delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual([plan['name'] for plan in response.json()], ['Free'])
+
+    def test_is_current_is_not_shared_between_users(self):
+        self.client.get(self.url)
+
+        user = User.objects.create_user(
+            username='cacheuser',
+            email='cacheuser@gmail.com',
+            password='testpass123',
+            plan=self.pro_plan
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+
+        current = {plan['name']: plan['is_current'] for plan in response.json()}
+        self.assertEqual(current, {'Free': False, 'Pro': True})
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertFalse(any(plan['is_current'] for plan in response.json()))
+
+
+class FreePlanIdTest(IsolatedCacheMixin, APITestCase):
+    def test_plans_version_bump_refreshes_memoized_free_plan_id(self):
+        old_free = Plan.objects.create(name='Free', order=1)
+        self.assertEqual(get_free_plan_id(), old_free.id)
+
+        # Changed by another worker: no signals run in this process...
+        Plan.objects.filter(pk=old_free.pk).update(name='Legacy')
+        [new_free] = Plan.objects.bulk_create([Plan(name='Free', order=2)])
+        self.assertEqual(get_free_plan_id(), old_free.id)
+
+        # ...until its version bump arrives through the shared cache
+        bump_plans_version()
+        self.assertEqual(get_free_plan_id(), new_free.id)
+
+
+class RequestInvalidationTest(SimpleTestCase):
+    def test_invalidations_coalesced_within_request(self):
+        invalidate = MagicMock()
+
+        start_request_invalidations()
+        invalidate_on_commit(invalidate)
+        invalidate_on_commit(invalidate)
+        invalidate.assert_not_called()
+        flush_request_invalidations()
+
+        invalidate.assert_called_once_with()
+
+
+class SingleFlightCacheTest(IsolatedCacheMixin, APITestCase):
+    key = 'single_flight_test'
+
+    def test_waiter_uses_value_built_by_lock_holder(self):
+        cache.add(f'lock:{self.key}', 1)
+        producer = MagicMock()
+
+        # Another worker holds the lock and stores the value while we wait
+        with patch('core.cache_utils.time.sleep', side_effect=lambda _: cache.set(self.key, ['built'])):
+            value = get_or_set_single_flight(self.key, producer, timeout=60)
+
+        self.assertEqual(value, ['built'])
+        producer.assert_not_called()
+
+    def test_vetoed_value_is_returned_but_not_cached(self):
+        value = get_or_set_single_flight(self.key, lambda: [None], timeout=60, cacheable=all)
+
+        self.assertEqual(value, [None])
+        self.assertEqual(cache.get_many([self.key, f'lock:{self.key}']), {})
+
+
+class PlanPriceLoadingTest(IsolatedCacheMixin, APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # One patch for the whole class instead of one per test
+        patcher = patch('core.serializers.stripe.Price.retrieve')
+        cls.mock_retrieve = patcher.start()
+        cls.addClassCleanup(patcher.stop)
+
+    @classmethod
+    def setUpTestData(cls):
+        Plan.objects.create(name='Free', order=1)
+        Plan.objects.create(
+            name='Pro',
+            order=3,
+            stripe_price_id_monthly='price_pro_month',
+            stripe_price_id_yearly='price_pro_year'
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.mock_retrieve.reset_mock(return_value=True, side_effect=True)
+        PlanSerializer.local_price_cache.clear()
+        self.url = '/core/plans/'
+
+    def tearDown(self):
+        PlanSerializer.local_price_cache.clear()
+
+    def test_only_uncached_prices_are_fetched(self):
+        cache.set('stripe_price_price_pro_month', {'amount': 10.0, 'currency': 'USD', 'interval': 'month'})
+        self.mock_retrieve.return_value = stripe_price('price_pro_year', 10000, 'year')
+
+        response = self.client.get(self.url)
+
+        self.mock_retrieve.assert_called_once_with('price_pro_year')
+        pro = next(plan for plan in response.json() if plan['name'] == 'Pro')
+        self.assertEqual(pro['monthly_price']['interval'], 'month')
+        self.assertEqual(pro['yearly_price'], {'amount': 100.0, 'currency': 'USD', 'interval': 'year'})
+        self.assertEqual(cache.get('stripe_price_price_pro_year')['amount'], 100.0)
+        self.assertEqual(StripePrice.objects.get(id='price_pro_year').unit_amount, 10000)
+
+    def test_list_rebuild_ignores_stale_local_prices(self):
+        StripePrice.sync(stripe_price('price_pro_month', 1500, 'month'))
+        StripePrice.sync(stripe_price('price_pro_year', 15000, 'year'))
+        # Another worker's copy from before a price change
+        PlanSerializer.local_price_cache.set('price_pro_month', {'amount': 1.0, 'currency': 'USD', 'interval': 'month'})
+
+        response = self.client.get(self.url)
+
+        pro = next(plan for plan in response.json() if plan['name'] == 'Pro')
+        self.assertEqual(pro['monthly_price']['amount'], 15.0)
+        self.mock_retrieve.assert_not_called()
+
+    def test_mirrored_prices_skip_stripe(self):
+        StripePrice.sync(stripe_price('price_pro_month', 1500, 'month'))
+        StripePrice.sync(stripe_price('price_pro_year', 15000, 'year'))
+
+        response = self.client.get(self.url)
+
+        self.mock_retrieve.assert_not_called()
+        pro = next(plan for plan in response.json() if plan['name'] == 'Pro')
+        self.assertEqual(pro['yearly_price'], {'amount': 150.0, 'currency': 'USD', 'interval': 'year'})
+
+
+class StripeWebhookCacheInvalidationTest(IsolatedCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = '/core/payments/webhook/stripe/'
+
+    def tearDown(self):
+        PlanSerializer.local_price_cache.clear()
+
+    def _post_event(self, event):
+        with patch('core.views.stripe.Webhook.construct_event', return_value=event):
+            return self.client.post(self.url, data=b'{}', content_type='application/json')
+
+    def test_price_update_reaches_a_warm_plan_list(self):
+        Plan.objects.create(name='Pro', order=3, stripe_price_id_monthly='price_123')
+        StripePrice.sync(stripe_price('price_123', 500, 'month'))
+        response = self.client.get('/core/plans/')
+        self.assertEqual(response.json()[0]['monthly_price']['amount'], 5.0)
+
+        self._post_event({
+            'id': 'evt_3',
+            'type': 'price.updated',
+            'data': {'object': stripe_price('price_123', 700, 'month')},
+        })
+
+        response = self.client.get('/core/plans/')
+        self.assertEqual(response.json()[0]['monthly_price']['amount'], 7.0)
+        self.assertEqual(PlanSerializer.local_price_cache.get('price_123')['amount'], 7.0)
+
+    def test_price_updated_drops_cached_price_and_plan_lists(self):
+        cache.set('stripe_price_price_123', {'amount': 5.0, 'currency': 'USD', 'interval': 'month'})
+        version = get_plans_version()
+
+        response = self._post_event({
+            'id': 'evt_1',
+            'type': 'price.updated',
+            'data': {'object': stripe_price('price_123', 700, 'month')},
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get('stripe_price_price_123'))
+        self.assertGreater(get_plans_version(), version)
+        self.assertEqual(StripePrice.objects.get(id='price_123').as_price_details()['amount'], 7.0)
+
+    def test_subscription_deleted_drops_cached_subscription_info(self):
+        cache.set('stripe_subscription_info_sub_123', {'interval': 'month'})
+        StripeSubscription.objects.create(id='sub_123', status='active', current_period_end=1900000000)
+
+        self._post_event({
+            'id': 'evt_2',
+            'type': 'customer.subscription.deleted',
+            'data': {'object': {'id': 'sub_123'}},
+        })
+
+        self.assertIsNone(cache.get('stripe_subscription_info_sub_123'))
+        self.assertFalse(StripeSubscription.objects.filter(id='sub_123').exists())
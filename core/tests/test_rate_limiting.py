@@ -4,11 +4,17 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
 from django.urls import reverse
+from core.middleware.rate_limit import RateLimitMiddleware
 from core.models import Plan
 from cv.models import CVQuestionnaire
 from unittest.mock import patch, Mock
-from core.throttling import get_rate_limit_status
+from io import StringIO
+import time
+from core.throttling import get_rate_limit_status, get_rate_limit_status_bulk
 
 User = get_user_model()
 
@@ -16,21 +22,22 @@ User = get_user_model()
 class RateLimitStatusEndpointTest(APITestCase):
     """Test the rate limit status endpoint."""
     
-    def setUp(self):
-        cache.clear()
-        
+    @classmethod
+    def setUpTestData(cls):
         # Create plans
-        self.free_plan = Plan.objects.create(name='Free')
-        self.basic_plan = Plan.objects.create(name='Basic')
+        cls.free_plan = Plan.objects.create(name='Free')
+        cls.basic_plan = Plan.objects.create(name='Basic')
         
         # Create user
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123',
-            plan=self.free_plan
+            plan=cls.free_plan
         )
-        
+    
+    def setUp(self):
+        cache.clear()
         self.client.force_authenticate(user=self.user)
     
     def tearDown(self):
@@ -194,28 +201,29 @@ class RateLimitStatusEndpointTest(APITestCase):
 class AIResponseThrottleTest(APITestCase):
     """Test AI response throttling."""
     
-    def setUp(self):
-        cache.clear()
-        
-        self.free_plan = Plan.objects.create(name='Free')
-        self.basic_plan = Plan.objects.create(name='Basic')
+    @classmethod
+    def setUpTestData(cls):
+        cls.free_plan = Plan.objects.create(name='Free')
+        cls.basic_plan = Plan.objects.create(name='Basic')
         
-        self.free_user = User.objects.create_user(
+        cls.free_user = User.objects.create_user(
             username='freeuser',
             email='free@example.com',
             password='testpass123',
-            plan=self.free_plan
+            plan=cls.free_plan
         )
         
-        self.questionnaire = CVQuestionnaire.objects.create(
-            user=self.free_user,
+        cls.questionnaire = CVQuestionnaire.objects.create(
+            user=cls.free_user,
             position='Software Engineer',
             industry='Tech',
             experience_level='3-5',
             company_size='medium',
             application_timeline='1-3 months'
         )
-        
+    
+    def setUp(self):
+        cache.clear()
         self.client.force_authenticate(user=self.free_user)
     
     def tearDown(self):
@@ -321,18 +329,19 @@ class AIResponseThrottleTest(APITestCase):
 class QuestionnaireThrottleTest(APITestCase):
     """Test questionnaire creation throttling."""
     
-    def setUp(self):
-        cache.clear()
-        
-        self.free_plan = Plan.objects.create(name='Free')
+    @classmethod
+    def setUpTestData(cls):
+        cls.free_plan = Plan.objects.create(name='Free')
         
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123',
-            plan=self.free_plan
+            plan=cls.free_plan
         )
-        
+    
+    def setUp(self):
+        cache.clear()
         self.client.force_authenticate(user=self.user)
     
     def tearDown(self):
@@ -366,18 +375,20 @@ class QuestionnaireThrottleTest(APITestCase):
 class GetRateLimitStatusHelperTest(APITestCase):
     """Test the get_rate_limit_status helper function."""
     
-    def setUp(self):
-        cache.clear()
+    @classmethod
+    def setUpTestData(cls):
+        cls.free_plan = Plan.objects.create(name='Free')
         
-        self.free_plan = Plan.objects.create(name='Free')
-        
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123',
-            plan=self.free_plan
+            plan=cls.free_plan
         )
     
+    def setUp(self):
+        cache.clear()
+    
     def tearDown(self):
         cache.clear()
     
@@ -433,19 +444,151 @@ class GetRateLimitStatusHelperTest(APITestCase):
         result = get_rate_limit_status(self.user, 'ai_responses')
         self.assertEqual(result['used'], 1)
         self.assertEqual(result['remaining'], 2)
+    
+    def test_api_calls_counted_per_window(self):
+        """Test that the api_calls counter is reported by the status helper."""
+        from core.throttling import GeneralAPIThrottle
+        
+        request = Mock(user=self.user, META={})
+        for _ in range(2):
+            self.assertTrue(GeneralAPIThrottle().allow_request(request, None))
+        
+        result = get_rate_limit_status(self.user, 'api_calls')
+        self.assertEqual(result['used'], 2)
+        self.assertEqual(result['remaining'], 98)
+    
+    def test_bulk_status_reads_all_scopes_at_once(self):
+        """Test that the bulk helper reads every scope's history in one call."""
+        cache.set(f'throttle_questionnaires_{self.user.pk}', [time.time() - 100], 86400)
+        
+        with patch('core.throttling.cache.get_many', wraps=cache.get_many) as get_many:
+            result = get_rate_limit_status_bulk(self.user, ['ai_responses', 'questionnaires'])
+        
+        get_many.assert_called_once()
+        self.assertEqual(result['ai_responses']['used'], 0)
+        self.assertEqual(result['questionnaires']['used'], 1)
+        self.assertEqual(result['questionnaires']['limit'], 5)
+
+
+
+class ManageRateLimitsCommandTest(APITestCase):
+    """Test the manage_rate_limits management command."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.free_plan = Plan.objects.create(name='Free')
+        
+        cls.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            plan=cls.free_plan
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def test_reset_clears_api_calls_counter(self):
+        """Test that reset clears the current api_calls window counter."""
+        from core.throttling import GeneralAPIThrottle
+        
+        request = Mock(user=self.user, META={})
+        for _ in range(3):
+            GeneralAPIThrottle().allow_request(request, None)
+        self.assertEqual(get_rate_limit_status(self.user, 'api_calls')['used'], 3)
+        
+        call_command('manage_rate_limits', 'reset', user='testuser', scope='api_calls', stdout=StringIO())
+        
+        self.assertEqual(get_rate_limit_status(self.user, 'api_calls')['used'], 0)
+    
+    def test_reset_clears_history_scopes(self):
+        """Test that reset clears the timestamp histories of the other scopes."""
+        cache.set(f'throttle_ai_responses_{self.user.pk}', [time.time() - 100], 86400)
+        
+        call_command('manage_rate_limits', 'reset', user='testuser', stdout=StringIO())
+        
+        self.assertEqual(get_rate_limit_status(self.user, 'ai_responses')['used'], 0)
+
+
+class PlanRenameThrottleTest(APITestCase):
+    """Test that throttles follow plan renames."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.basic_plan = Plan.objects.create(name='Basic')
+    
+    def setUp(self):
+        cache.clear()
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def test_plan_rename_changes_throttle_rate(self):
+        """Test that throttles apply the new rates once a plan is renamed."""
+        from core.throttling import AIResponseThrottle
+        
+        plan = Plan.objects.create(name='Starter')
+        user = User.objects.create_user(
+            username='renameuser',
+            email='renameuser@example.com',
+            password='testpass123',
+            plan=plan
+        )
+        request = Mock(user=user, META={})
+        
+        throttle = AIResponseThrottle()
+        throttle.allow_request(request, None)
+        self.assertEqual(throttle.num_requests, 3)  # Unknown plan: default rate
+        
+        plan.name = 'Pro'
+        with self.captureOnCommitCallbacks(execute=True):
+            plan.save()
+        
+        throttle = AIResponseThrottle()
+        throttle.allow_request(request, None)
+        self.assertEqual(throttle.num_requests, 100)
+    
+    def test_plan_rename_by_another_process_changes_throttle_rate(self):
+        """Test that a rename seen only through the plans version is picked up."""
+        from core.cache_utils import bump_plans_version
+        from core.throttling import AIResponseThrottle
+        
+        user = User.objects.create_user(
+            username='renameuser',
+            email='renameuser@example.com',
+            password='testpass123',
+            plan=self.basic_plan
+        )
+        request = Mock(user=user, META={})
+        
+        throttle = AIResponseThrottle()
+        throttle.allow_request(request, None)
+        self.assertEqual(throttle.num_requests, 20)
+        
+        # No signals run in this process; only the version bump arrives
+        Plan.objects.filter(pk=self.basic_plan.pk).update(name='Pro')
+        bump_plans_version()
+        
+        throttle = AIResponseThrottle()
+        throttle.allow_request(request, None)
+        self.assertEqual(throttle.num_requests, 100)
 
 
 class PlanBasedThrottleTest(APITestCase):
     """Test plan-based throttling across different plan tiers."""
     
+    @classmethod
+    def setUpTestData(cls):
+        # Create all plans in one INSERT (no plan signals needed here)
+        cls.free_plan, cls.basic_plan, cls.pro_plan, cls.premium_plan = Plan.objects.bulk_create([
+            Plan(name=name) for name in ('Free', 'Basic', 'Pro', 'Premium')
+        ])
+    
     def setUp(self):
         cache.clear()
-        
-        # Create all plans
-        self.free_plan = Plan.objects.create(name='Free')
-        self.basic_plan = Plan.objects.create(name='Basic')
-        self.pro_plan = Plan.objects.create(name='Pro')
-        self.premium_plan = Plan.objects.create(name='Premium')
     
     def tearDown(self):
         cache.clear()
@@ -491,30 +634,169 @@ class PlanBasedThrottleTest(APITestCase):
             
             # Cleanup
             user.delete()
+    
+    def test_allow_request_applies_the_users_plan_rate(self):
+        """Test that the throttle enforces the requesting user's plan rate."""
+        from core.throttling import AIResponseThrottle
+        
+        user = User.objects.create_user(
+            username='basicuser',
+            email='basic@example.com',
+            password='testpass123',
+            plan=self.basic_plan
+        )
+        throttle = AIResponseThrottle()
+        
+        self.assertTrue(throttle.allow_request(Mock(user=user, META={}), None))
+        self.assertEqual((throttle.num_requests, throttle.duration), (20, 86400))
+    
+    def test_plan_rate_lookup_does_not_load_the_plan(self):
+        """Test that rates are resolved from plan_id without querying the plan."""
+        user = User.objects.create_user(
+            username='prouser',
+            email='pro@example.com',
+            password='testpass123',
+            plan=self.pro_plan
+        )
+        user = User.objects.get(pk=user.pk)  # plan not loaded
+        get_rate_limit_status(user, 'ai_responses')  # warm the plan-name map
+        
+        with self.assertNumQueries(0):
+            result = get_rate_limit_status(user, 'ai_responses')
+        
+        self.assertEqual(result['limit'], 100)
+        self.assertEqual(result['plan'], 'Pro')
+    
+    def test_premium_requests_are_not_counted(self):
+        """Test that bypass plans skip the throttle and its cache entirely."""
+        from core.throttling import AIResponseThrottle
+        
+        user = User.objects.create_user(
+            username='premiumuser',
+            email='premium@example.com',
+            password='testpass123',
+            plan=self.premium_plan
+        )
+        
+        with patch('core.throttling.cache') as mock_cache:
+            self.assertTrue(AIResponseThrottle().allow_request(Mock(user=user, META={}), None))
+            result = get_rate_limit_status(user, 'ai_responses')
+        
+        mock_cache.get_many.assert_not_called()
+        self.assertIsNone(cache.get(f'throttle_ai_responses_{user.pk}'))
+        self.assertEqual(result['used'], 0)
+        self.assertEqual(result['remaining'], 1000)
 
 
-class CacheKeyTest(APITestCase):
-    """Test that cache keys are properly generated and unique."""
+class IPBasedThrottleTest(APITestCase):
+    """Test the GCRA-based per-IP throttle."""
     
     def setUp(self):
         cache.clear()
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def test_ip_throttled_after_rate_with_wait(self):
+        """Test that an IP is refused once its rate is used up, with a retry delay."""
+        from core.throttling import IPBasedThrottle
         
-        self.plan = Plan.objects.create(name='Free')
+        class TwoPerMinuteThrottle(IPBasedThrottle):
+            def get_rate(self):
+                return '2/minute'
         
-        self.user1 = User.objects.create_user(
+        request = Mock(spec=['META'], META={'REMOTE_ADDR': '10.0.0.1'})
+        
+        self.assertTrue(TwoPerMinuteThrottle().allow_request(request, None))
+        self.assertTrue(TwoPerMinuteThrottle().allow_request(request, None))
+        
+        throttle = TwoPerMinuteThrottle()
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertGreater(throttle.wait(), 0)
+        self.assertLessEqual(throttle.wait(), 30)
+        
+        # The ident is parsed once per request and reused by later throttles
+        self.assertEqual(request._throttle_ident, '10.0.0.1')
+        
+        # Other IPs have their own allowance
+        self.assertTrue(TwoPerMinuteThrottle().allow_request(Mock(spec=['META'], META={'REMOTE_ADDR': '10.0.0.2'}), None))
+
+
+class BurstRateThrottleTest(APITestCase):
+    """Test the fixed-window burst throttle."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.basic_plan = Plan.objects.create(name='Basic')
+        cls.user = User.objects.create_user(
+            username='burstuser',
+            email='burst@example.com',
+            password='testpass123',
+            plan=cls.basic_plan
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def test_burst_limit_follows_plan_and_resets_with_window(self):
+        """Test that the burst limit uses the user's plan and reports the window reset."""
+        from core.throttling import BurstRateThrottle
+        
+        request = Mock(user=self.user, META={})
+        
+        for i in range(30):
+            self.assertTrue(BurstRateThrottle().allow_request(request, None), f"Request {i+1} should pass")
+        
+        throttle = BurstRateThrottle()
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertEqual(throttle.num_requests, 30)
+        self.assertGreater(throttle.wait(), 0)
+        self.assertLessEqual(throttle.wait(), 60)
+    
+    def test_planless_user_costs_no_query(self):
+        """Test that a user without a plan gets the Free burst rate without a Plan query."""
+        from core.throttling import BurstRateThrottle
+        
+        user = User.objects.create_user(
+            username='planlessuser',
+            email='planless@example.com',
+            password='testpass123'
+        )
+        user.plan = None
+        throttle = BurstRateThrottle()
+        
+        with self.assertNumQueries(0):
+            self.assertTrue(throttle.allow_request(Mock(user=user, META={}), None))
+        self.assertEqual(throttle.num_requests, 10)
+
+
+class CacheKeyTest(APITestCase):
+    """Test that cache keys are properly generated and unique."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = Plan.objects.create(name='Free')
+        
+        cls.user1 = User.objects.create_user(
             username='user1',
             email='user1@example.com',
             password='testpass123',
-            plan=self.plan
+            plan=cls.plan
         )
         
-        self.user2 = User.objects.create_user(
+        cls.user2 = User.objects.create_user(
             username='user2',
             email='user2@example.com',
             password='testpass123',
-            plan=self.plan
+            plan=cls.plan
         )
     
+    def setUp(self):
+        cache.clear()
+    
     def tearDown(self):
         cache.clear()
     
@@ -555,4 +837,44 @@ class CacheKeyTest(APITestCase):
         ai_key = ai_throttle.get_cache_key(request, None)
         quest_key = quest_throttle.get_cache_key(request, None)
         
-        self.assertNotEqual(ai_key, quest_key, "Different scopes should have different cache keys")
\ No newline at end of file
+        self.assertNotEqual(ai_key, quest_key, "Different scopes should have different cache keys")
+
+
+class RateLimitMiddlewareTest(SimpleTestCase):
+    """Test the IP rate limiting middleware."""
+    
+    def setUp(self):
+        cache.clear()
+        self.middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        self.middleware.limits = {
+            'requests_per_minute': 2,
+            'requests_per_hour': 1000,
+            'suspicious_threshold': 4,
+        }
+        self.factory = RequestFactory()
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def test_rejected_requests_are_not_counted(self):
+        """Test that retrying after a 429 neither raises the count nor blocks the IP."""
+        statuses = [
+            self.middleware(self.factory.get('/api/plans/')).status_code
+            for _ in range(6)
+        ]
+        
+        self.assertEqual(statuses, [200, 200, 429, 429, 429, 429])
+        self.assertFalse(cache.get('blocked:ip:127.0.0.1'))
+    
+    @override_settings(RATE_LIMIT_EMIT_HEADERS=True)
+    def test_blocked_ip_is_not_counted(self):
+        """Test that requests from a blocked IP are rejected without counting them."""
+        self.middleware.block_ip('127.0.0.1')
+        
+        response = self.middleware(self.factory.get('/api/plans/'))
+        self.assertEqual(response.status_code, 403)
+        
+        cache.delete('blocked:ip:127.0.0.1')
+        response = self.middleware(self.factory.get('/api/plans/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-RateLimit-Remaining'], '1')
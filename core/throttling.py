@@ -2,11 +2,63 @@
 from rest_framework.throttling import SimpleRateThrottle, UserRateThrottle
 from rest_framework.exceptions import Throttled
 from django.core.cache import cache
-from django.utils import timezone
-from datetime import timedelta
+from django_redis import get_redis_connection
+from core.cache_utils import counter_window_key, incr_window_counter
+from core.models import get_plan_name
+from bisect import bisect_left
+from datetime import datetime, timezone
+from functools import lru_cache
 import hashlib
+import operator
+import time
 
-class PlanBasedThrottle(UserRateThrottle):
+
+@lru_cache(maxsize=32)
+def _parse_rate(rate):
+    # Rates come from a small fixed set of strings, so parse each only once
+    return SimpleRateThrottle.parse_rate(None, rate)
+
+
+def _parse_plan_rates(plan_rates):
+    """
+    Parse a PLAN_RATES table into (num_requests, duration) tuples up front.
+    """
+    return {
+        plan_name: {
+            scope: _parse_rate(rate)
+            for scope, rate in scopes.items()
+        }
+        for plan_name, scopes in plan_rates.items()
+    }
+
+
+class RequestIdentMixin:
+    """
+    Remember the client ident on the request, so the several throttles
+    checking one request parse the forwarding headers only once.
+    """
+    
+    def get_ident(self, request):
+        ident = getattr(request, '_throttle_ident', None)
+        if ident is None:
+            ident = super().get_ident(request)
+            request._throttle_ident = ident
+        return ident
+
+
+class CachedRateParsingMixin:
+    """
+    Parse rate strings through the shared memo instead of on every
+    throttle instantiation.
+    """
+    
+    def parse_rate(self, rate):
+        if rate is None:
+            return (None, None)
+        return _parse_rate(rate)
+
+
+class PlanBasedThrottle(RequestIdentMixin, CachedRateParsingMixin, UserRateThrottle):
     """
     Base throttle class that adjusts rate based on user's subscription plan.
     """
@@ -36,11 +88,21 @@ class PlanBasedThrottle(UserRateThrottle):
             'api_calls': '1200/hour',
         },
     }
+    _PARSED_RATES = _parse_plan_rates(PLAN_RATES)
+    
+    # Plans whose usage isn't counted: no cache read or write per request
+    BYPASS_PLANS = frozenset({'Premium'})
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'PLAN_RATES' in cls.__dict__:
+            cls._PARSED_RATES = _parse_plan_rates(cls.PLAN_RATES)
     
     def __init__(self):
-        super().__init__()
         self.plan_name = None
         self.current_limit = None
+        self.parsed_rate = None
+        super().__init__()
         
     def get_cache_key(self, request, view):
         """
@@ -51,10 +113,8 @@ class PlanBasedThrottle(UserRateThrottle):
         else:
             ident = self.get_ident(request)
         
-        return self.cache_format % {
-            'scope': self.scope,
-            'ident': ident
-        }
+        # Same key as cache_format, without building a dict to %-format
+        return f'throttle_{self.scope}_{ident}'
     
     def get_rate(self):
         """
@@ -66,18 +126,47 @@ class PlanBasedThrottle(UserRateThrottle):
         user = getattr(self.request, 'user', None)
         
         # Anonymous or no plan - use Free tier limits
-        if not user or not user.is_authenticated or not user.plan:
+        if not user or not user.is_authenticated or not user.plan_id:
             self.plan_name = 'Free'
+            self.parsed_rate = self._PARSED_RATES['Free'].get(self.scope)
             return self.PLAN_RATES['Free'].get(self.scope, '3/day')
         
-        # Get plan-specific rate
-        plan_name = user.plan.name
+        # Get plan-specific rate; looked up by id so user.plan isn't loaded
+        plan_name = get_plan_name(user.plan_id)
         self.plan_name = plan_name
         rate = self.PLAN_RATES.get(plan_name, {}).get(self.scope, '3/day')
         self.current_limit = rate
+        self.parsed_rate = self._PARSED_RATES.get(plan_name, {}).get(self.scope)
         
         return rate
     
+    def parse_rate(self, rate):
+        """
+        Use the tuple get_rate looked up instead of parsing the rate string again.
+        """
+        if self.parsed_rate is not None:
+            return self.parsed_rate
+        return super().parse_rate(rate)
+    
+    def allow_request(self, request, view):
+        """
+        DRF resolves the rate in __init__, before the request (and so the
+        user's plan) is known; resolve it for this request's user.
+        """
+        self.request = request
+        self.rate = self.get_rate()
+        if self.plan_name in self.BYPASS_PLANS:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return self.allow_counted_request(request, view)
+    
+    def allow_counted_request(self, request, view):
+        """
+        Check and record the request against the resolved rate; by default
+        DRF's sliding window over a timestamp history.
+        """
+        return super().allow_request(request, view)
+    
     def throttle_success(self):
         """
         Called when request is allowed. Update the cache.
@@ -90,8 +179,8 @@ class PlanBasedThrottle(UserRateThrottle):
         if not request:
             raise Throttled()
         
-        # Get user's current plan
-        plan_name = request.user.plan.name if request.user.plan else 'Free'
+        # User's current plan, as resolved by get_rate
+        plan_name = self.plan_name or 'Free'
         
         # Determine recommended upgrade
         plan_hierarchy = ['Free', 'Basic', 'Pro', 'Premium']
@@ -134,11 +223,26 @@ class QuestionnaireThrottle(PlanBasedThrottle):
 class GeneralAPIThrottle(PlanBasedThrottle):
     """
     General API throttle for all authenticated endpoints.
+    
+    An hourly fixed-window counter is precise enough here, so it uses an
+    atomic cache.incr instead of reading and rewriting a timestamp history.
     """
     scope = 'api_calls'
+    
+    def allow_counted_request(self, request, view):
+        self.key = self.get_cache_key(request, view)
+        now = self.timer()
+        window = int(now // self.duration)
+        count = incr_window_counter(self.key, now, self.duration)
+        
+        self.wait_seconds = (window + 1) * self.duration - now
+        return count <= self.num_requests
+    
+    def wait(self):
+        return self.wait_seconds
 
 
-class AnonRateThrottle(SimpleRateThrottle):
+class AnonRateThrottle(RequestIdentMixin, CachedRateParsingMixin, SimpleRateThrottle):
     """
     Strict rate limiting for anonymous/unauthenticated users.
     """
@@ -148,10 +252,7 @@ class AnonRateThrottle(SimpleRateThrottle):
         if request.user and request.user.is_authenticated:
             return None  # Only throttle anonymous users
             
-        return self.cache_format % {
-            'scope': self.scope,
-            'ident': self.get_ident(request)
-        }
+        return f'throttle_{self.scope}_{self.get_ident(request)}'
     
     def get_rate(self):
         """
@@ -160,9 +261,12 @@ class AnonRateThrottle(SimpleRateThrottle):
         return '20/hour'
 
 
-class BurstRateThrottle(SimpleRateThrottle):
+class BurstRateThrottle(RequestIdentMixin, CachedRateParsingMixin, SimpleRateThrottle):
     """
     Allow short bursts of requests but prevent sustained high rates.
+    
+    Counts requests per fixed one-minute window with an atomic cache.incr
+    instead of DRF's timestamp history: constant size, one round trip.
     """
     scope = 'burst'
     
@@ -172,46 +276,100 @@ class BurstRateThrottle(SimpleRateThrottle):
         else:
             ident = self.get_ident(request)
             
-        return self.cache_format % {
-            'scope': self.scope,
-            'ident': ident
-        }
+        return f'throttle_{self.scope}_{ident}'
     
     def get_rate(self):
         """
         Allow bursts but limit sustained usage.
         """
         if hasattr(self, 'request') and self.request.user.is_authenticated:
-            user = self.request.user
-            if user.plan and user.plan.name == 'Premium':
+            plan_name = user_plan_name(self.request.user)
+            if plan_name == 'Premium':
                 return '100/minute'
-            elif user.plan and user.plan.name == 'Pro':
+            elif plan_name == 'Pro':
                 return '50/minute'
-            elif user.plan and user.plan.name == 'Basic':
+            elif plan_name == 'Basic':
                 return '30/minute'
         
         return '10/minute'  # Free/Anonymous
+    
+    def allow_request(self, request, view):
+        self.key = self.get_cache_key(request, view)
+        
+        # The rate depends on the user's plan, unknown when DRF parsed it in __init__
+        self.request = request
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        
+        now = self.timer()
+        window = int(now // self.duration)
+        count = incr_window_counter(self.key, now, self.duration)
+        
+        self.wait_seconds = (window + 1) * self.duration - now
+        return count <= self.num_requests
+    
+    def wait(self):
+        return self.wait_seconds
+
+
+# GCRA (generic cell rate algorithm): the key holds only the theoretical
+# arrival time (TAT) of the next request, so an entry is one float however
+# many requests it covers. Run as a script so check-and-update is atomic.
+# KEYS[1]: throttle key; ARGV: now, seconds between requests, window.
+# Returns nil when allowed, else the seconds to wait (as a string; Lua
+# numbers returned to Redis are truncated to integers).
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local separation = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local new_tat = tat + separation
+if new_tat - now > window then
+    return tostring(new_tat - now - window)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return false
+"""
+
+_gcra_script = None
 
 
-class IPBasedThrottle(SimpleRateThrottle):
+def _run_gcra(key, now, separation, window):
+    global _gcra_script
+    if _gcra_script is None:
+        _gcra_script = get_redis_connection('default').register_script(GCRA_SCRIPT)
+    return _gcra_script(keys=[cache.make_key(key)], args=[now, separation, window])
+
+
+class IPBasedThrottle(RequestIdentMixin, CachedRateParsingMixin, SimpleRateThrottle):
     """
     IP-based throttle for DDoS protection.
     Works even for authenticated users as a safety net.
+    
+    Runs on every request, so it uses GCRA instead of DRF's timestamp
+    history (up to 1000 floats per IP, read and rewritten each time).
     """
     scope = 'ip_based'
     
     def get_cache_key(self, request, view):
-        ident = self.get_ident(request)
-        return self.cache_format % {
-            'scope': self.scope,
-            'ident': ident
-        }
+        return f'throttle_{self.scope}_{self.get_ident(request)}'
     
     def get_rate(self):
         """
         Per-IP rate limit regardless of authentication.
         """
         return '1000/hour'
+    
+    def allow_request(self, request, view):
+        self.key = self.get_cache_key(request, view)
+        wait = _run_gcra(
+            self.key, self.timer(), self.duration / self.num_requests, self.duration
+        )
+        self.wait_seconds = None if wait is None else float(wait)
+        return wait is None
+    
+    def wait(self):
+        return self.wait_seconds
 
 
 class UploadThrottle(PlanBasedThrottle):
@@ -228,53 +386,111 @@ class UploadThrottle(PlanBasedThrottle):
     }
 
 
+def user_plan_name(user):
+    """
+    Name of the user's plan ('Free' without one), without loading user.plan.
+    """
+    return (get_plan_name(user.plan_id) if user.plan_id else None) or 'Free'
+
+
+# Scopes reported by get_rate_limit_status; others report ai_responses
+STATUS_SCOPES = ('ai_responses', 'questionnaires', 'api_calls')
+# PlanBasedThrottle.get_rate's '3/day' fallback
+DEFAULT_PARSED_RATE = (3, 86400)
+# Scopes whose throttle keeps a fixed-window counter instead of a history
+COUNTER_SCOPES = frozenset({'api_calls'})
+
+
 # Helper function to get rate limit status for a user
-def get_rate_limit_status(user, scope='ai_responses'):
+def get_rate_limit_status(user, scope='ai_responses', plan_name=None):
     """
     Get current rate limit status for a user.
     Returns: dict with usage info
     """
+    statuses = get_rate_limit_status_bulk(user, [scope], plan_name)
+    return statuses[scope] if statuses else None
+
+
+def get_rate_limit_status_bulk(user, scopes, plan_name=None):
+    """
+    get_rate_limit_status for several scopes, reading every usage history
+    in a single cache.get_many round trip. Pass ``plan_name`` when the
+    caller has already resolved the user's plan.
+    Returns: dict of scope -> usage info
+    """
     if not user or not user.is_authenticated:
         return None
     
-    throttle_class = {
-        'ai_responses': AIResponseThrottle,
-        'questionnaires': QuestionnaireThrottle,
-        'api_calls': GeneralAPIThrottle,
-    }.get(scope, AIResponseThrottle)
-    
-    throttle = throttle_class()
-    
-    # Create a mock request
-    class MockRequest:
-        def __init__(self, user):
-            self.user = user
-            self.META = {}
-    
-    mock_request = MockRequest(user)
-    throttle.request = mock_request
-    
-    rate = throttle.get_rate()
-    num_requests, duration = throttle.parse_rate(rate)
+    # Same numbers and cache keys the scopes' throttles would use, without
+    # building a throttle and a stand-in request for each
+    if plan_name is None:
+        plan_name = user_plan_name(user)
+    plan_rates = PlanBasedThrottle._PARSED_RATES.get(plan_name, {})
+    throttle_scopes = {
+        scope: scope if scope in STATUS_SCOPES else 'ai_responses'
+        for scope in scopes
+    }
+    parsed_rates = {
+        scope: plan_rates.get(throttle_scope, DEFAULT_PARSED_RATE)
+        for scope, throttle_scope in throttle_scopes.items()
+    }
     
     # Get current usage from cache
-    cache_key = throttle.get_cache_key(mock_request, None)
-    history = cache.get(cache_key, [])
-    
-    # Filter to requests within the current window
-    now = throttle.timer()
-    while history and history[-1] <= now - duration:
-        history.pop()
+    now = time.time()
+    cache_keys = {
+        scope: usage_cache_key(user, throttle_scope, plan_name, now)
+        for scope, throttle_scope in throttle_scopes.items()
+    }
+    if plan_name in PlanBasedThrottle.BYPASS_PLANS:
+        # Not counted by the throttles, so there is no usage to read
+        usage = {}
+    else:
+        usage = cache.get_many(set(cache_keys.values()))
     
-    used = len(history)
-    remaining = max(0, num_requests - used)
+    return {
+        scope: _usage_status(
+            scope,
+            plan_name,
+            parsed_rates[scope],
+            usage.get(cache_keys[scope]),
+            throttle_scopes[scope] in COUNTER_SCOPES,
+            now,
+        )
+        for scope in scopes
+    }
+
+
+def usage_cache_key(user, scope, plan_name, now):
+    """
+    Cache key holding ``user``'s usage of a throttle scope: the timestamp
+    history, or for COUNTER_SCOPES the counter of the window covering ``now``.
+    """
+    cache_key = f'throttle_{scope}_{user.pk}'
+    if scope in COUNTER_SCOPES:
+        plan_rates = PlanBasedThrottle._PARSED_RATES.get(plan_name, {})
+        duration = plan_rates.get(scope, DEFAULT_PARSED_RATE)[1]
+        cache_key = counter_window_key(cache_key, now, duration)
+    return cache_key
+
+
+def _usage_status(scope, plan_name, parsed_rate, usage, is_counter, now):
+    num_requests, duration = parsed_rate
     
-    # Calculate reset time
-    if history:
-        reset_seconds = duration - (now - history[-1])
-        reset_time = timezone.now() + timedelta(seconds=reset_seconds)
+    if is_counter:
+        # Fixed-window count; resets when the window ends
+        used = usage or 0
+        reset_epoch = (now // duration + 1) * duration
     else:
-        reset_time = timezone.now() + timedelta(seconds=duration)
+        # Filter to requests within the current window. DRF keeps the history
+        # newest-first, so the expired entries are a tail found by bisection
+        history = usage or []
+        history = history[:bisect_left(history, duration - now, key=operator.neg)]
+        used = len(history)
+        # Reset one window after the oldest counted request
+        reset_epoch = (history[-1] if history else now) + duration
+    
+    remaining = max(0, num_requests - used)
+    reset_time = datetime.fromtimestamp(reset_epoch, tz=timezone.utc)
     
     return {
         'scope': scope,
@@ -282,5 +498,5 @@ def get_rate_limit_status(user, scope='ai_responses'):
         'used': used,
         'remaining': remaining,
         'reset_at': reset_time,
-        'plan': user.plan.name if user.plan else 'Free'
-    }
\ No newline at end of file
+        'plan': plan_name
+    }
@@ -5,26 +5,35 @@ from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
 from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter
 from django.conf import settings
 from django.http import JsonResponse, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from django.contrib.auth import get_user_model
 from .serializers import CustomUserDetailsSerializer, PlanSerializer
-from .models import Plan
+from .models import Plan, StripePrice, StripeSubscription
 from datetime import datetime
 from django.utils import timezone
 from django.core.cache import cache
-from core.throttling import get_rate_limit_status
+from core.throttling import get_rate_limit_status_bulk, user_plan_name
+from core.tasks import HEALTH_CHECK_CACHE_KEY, refresh_health_check
+from core.cache_utils import (
+    bump_plans_version,
+    get_or_set_single_flight,
+    jittered_ttl,
+    plans_list_cache_key,
+    plans_list_response_cache_key,
+    PLANS_LIST_TIMEOUT,
+)
 from dj_rest_auth.registration.views import SocialLoginView
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
-from django.db import connection
-from redis import Redis
-from openai import OpenAI
-import os
 
 import stripe
 import logging
+import json
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +50,18 @@ class CustomUserDetailsView(UserDetailsView):
     serializer_class = CustomUserDetailsSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        # Everything CustomUserDetailsSerializer reads, with the nested plan joined in
+        return User.objects.select_related('plan').only(
+            'id', 'username', 'email', 'first_name', 'last_name', 'date_of_birth',
+            'plan_id', 'stripe_subscription_id', 'stripe_customer_id', 'stripe_subscription_status',
+            'plan__id', 'plan__name', 'plan__description',
+            'plan__stripe_price_id_monthly', 'plan__stripe_price_id_yearly',
+        )
+
+    def get_object(self):
+        return self.get_queryset().get(pk=self.request.user.pk)
+
 class GoogleLogin(SocialLoginView):
     adapter_class = GoogleOAuth2Adapter
 
@@ -164,6 +185,7 @@ class StripeWebhookView(APIView):
                 if subscription_id:
                     try:
                         subscription = stripe.Subscription.retrieve(subscription_id)
+                        StripeSubscription.sync(subscription)
                         user.stripe_subscription_id = subscription_id
                         user.stripe_subscription_status = "active"
 
@@ -188,6 +210,8 @@ class StripeWebhookView(APIView):
             subscription_id = subscription["id"]
 
             logger.warning(f"⚠ Processing subscription cancellation - Subscription ID: {subscription_id}")
+            cache.delete(f"stripe_subscription_info_{subscription_id}")
+            StripeSubscription.objects.filter(id=subscription_id).delete()
 
             try:
                 user = User.objects.get(stripe_subscription_id=subscription_id)
@@ -204,6 +228,8 @@ class StripeWebhookView(APIView):
             status = subscription["status"]
 
             logger.info(f"🔄 Processing subscription update - Subscription ID: {subscription_id}, Status: {status}")
+            cache.delete(f"stripe_subscription_info_{subscription_id}")
+            StripeSubscription.sync(subscription)
 
             try:
                 user = User.objects.get(stripe_subscription_id=subscription_id)
@@ -230,6 +256,23 @@ class StripeWebhookView(APIView):
             except User.DoesNotExist:
                 logger.error(f"❌ No user found with subscription ID {subscription_id}")               
 
+        elif event_type == "customer.subscription.created":
+            # The user is linked on checkout.session.completed; only mirror it here
+            StripeSubscription.sync(event["data"]["object"])
+
+        elif event_type in ("price.created", "price.updated", "price.deleted"):
+            price = event["data"]["object"]
+            price_id = price["id"]
+            logger.info(f"💲 Invalidating cached price - Price ID: {price_id}")
+            if event_type == "price.deleted":
+                StripePrice.objects.filter(id=price_id).delete()
+            else:
+                StripePrice.sync(price)
+            cache.delete(f"stripe_price_{price_id}")
+            PlanSerializer.local_price_cache.delete(price_id)
+            # Cached plan lists embed price details
+            bump_plans_version()
+
         return HttpResponse(status=200)
     
 
@@ -287,7 +330,79 @@ class PlanListView(ListAPIView):
             queryset = queryset.exclude(stripe_price_id_yearly__isnull=True).exclude(stripe_price_id_yearly='')
             logger.debug(f"Filtered to {queryset.count()} yearly plans")
 
-        return queryset    
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = self.request.user
+        context['user_plan_id'] = user.plan_id if user.is_authenticated else None
+        return context
+
+    def list(self, request, *args, **kwargs):
+        billing = request.query_params.get('billing')
+        variant = billing if billing in ('monthly', 'yearly') else 'all'
+        cache_key = plans_list_cache_key(variant)
+
+        context = self.get_serializer_context()
+
+        # The list changes only with the plans version, and is_current with the user's plan
+        etag = f'W/"{cache_key}-{context["user_plan_id"] or 0}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return self._vary_on_user(Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}))
+
+        # The rendered body for this user's plan; a hit skips serializing and rendering.
+        # Only JSON is cached, so other formats (the browsable API) always render
+        response_key = plans_list_response_cache_key(cache_key, context['user_plan_id'])
+        content = cache.get(response_key) if request.accepted_renderer.format == 'json' else None
+        if content is not None:
+            response = HttpResponse(content, content_type=JSONRenderer.media_type)
+            response['ETag'] = etag
+            return self._vary_on_user(response)
+
+        # Single-flight: on a cold key one worker builds the list, the others wait for it.
+        # Cached as compact JSON rather than a pickled list of dicts
+        plans = json.loads(get_or_set_single_flight(
+            cache_key,
+            lambda: self._encode_plans(context),
+            timeout=PLANS_LIST_TIMEOUT,
+            cacheable=lambda encoded: self._all_prices_resolved(json.loads(encoded)),
+        ))
+
+        # is_current depends on the requesting user, so the shared list never holds it
+        current_plan_id = context['user_plan_id']
+        data = [
+            {**plan, 'is_current': plan['id'] == current_plan_id}
+            for plan in plans
+        ]
+        response = Response(data)
+        # A list with a failed price lookup isn't cached, so don't let clients keep it either
+        if self._all_prices_resolved(plans):
+            cache.set(response_key, JSONRenderer().render(data), timeout=jittered_ttl(PLANS_LIST_TIMEOUT))
+            response['ETag'] = etag
+        return self._vary_on_user(response)
+
+    @staticmethod
+    def _vary_on_user(response):
+        # is_current (and so the body and ETag) depends on who is asking
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+    def _serialize_plans(self, context):
+        plan_objects = list(self.get_queryset())
+        context['price_details'] = PlanSerializer.load_price_details(plan_objects)
+        serializer = self.get_serializer_class()(plan_objects, many=True, context=context)
+        return [
+            {key: value for key, value in plan.items() if key != 'is_current'}
+            for plan in serializer.data
+        ]
+
+    def _encode_plans(self, context):
+        return JSONRenderer().render(self._serialize_plans(context))
+
+    @staticmethod
+    def _all_prices_resolved(plans):
+        # Don't pin a failed Stripe price lookup for the whole TTL
+        return all(plan['monthly_price'] is not None and plan['yearly_price'] is not None for plan in plans)
     
 class CreateBillingPortalSessionView(APIView):
     permission_classes = [IsAuthenticated]
@@ -369,7 +484,6 @@ class VerifyCheckoutSessionView(APIView):
             )
             subscription = session.get("subscription")
             items = subscription.get("items", {}).get("data", [])
-            print(f"subscription: {subscription}")
             if not subscription:
                 logger.warning(f"⚠️ No subscription found in session - User: {request.user.email}, Session ID: {session_id}")
                 return Response({"error": "No subscription found in session."}, status=status.HTTP_400_BAD_REQUEST)
@@ -417,7 +531,7 @@ class VerifyCheckoutSessionView(APIView):
                 }
             }
 
-            cache.set(cache_key, response_data, timeout=60 * 60)  # 1 hour
+            cache.set(cache_key, response_data, timeout=jittered_ttl(60 * 60))  # ~1 hour
             logger.debug(f"💾 Session verification result cached - Session ID: {session_id}")
             return Response(response_data)
 
@@ -488,52 +602,20 @@ class HealthCheckView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        logger.debug(" Health check initiated")
-        services = {}
-
-        # Check DB
+        # Probes run in the refresh_health_check beat task; this is a cache read
         try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1")
-            services['db'] = 'healthy'
-            logger.debug("✅ Database health check: healthy")
+            health = cache.get(HEALTH_CHECK_CACHE_KEY)
         except Exception as e:
-            logger.error(f"DB health check failed: {e}")
-            services['db'] = 'unhealthy'
-
-        # Check Redis
-        try:
-            redis_client = Redis.from_url(settings.CACHE_URL)
-            redis_client.ping()
-            services['redis'] = 'healthy'
-            logger.debug("✅ Redis health check: healthy")
-        except Exception as e:
-            logger.error(f"Redis health check failed: {e}")
-            services['redis'] = 'unhealthy'
-
-        # Check OpenAI (optional)
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            try:
-                client = OpenAI(api_key=api_key)
-                client.models.list()  # Lightweight check
-                services['openai'] = 'healthy'
-                logger.debug("✅ OpenAI health check: healthy")
-            except Exception as e:
-                logger.error(f"OpenAI health check failed: {e}")
-                services['openai'] = 'unhealthy'
-
-        else:
-            services['openai'] = 'skipped'
+            logger.error(f"Health check cache unavailable: {e}")
+            health = None
 
-        # Determine overall status
-        overall = 'healthy' if services['db'] == 'healthy' and services['redis'] == 'healthy' else 'unhealthy'
-        http_status = status.HTTP_200_OK if overall == 'healthy' else status.HTTP_503_SERVICE_UNAVAILABLE
+        if health is None:
+            # Beat hasn't run yet (or Redis is down): probe inline
+            logger.debug(" Health check initiated")
+            health = refresh_health_check()
 
-        return Response({
-            'overall': overall,
-            'services': services
-        }, status=http_status)
+        http_status = status.HTTP_200_OK if health['overall'] == 'healthy' else status.HTTP_503_SERVICE_UNAVAILABLE
+        return Response(health, status=http_status)
 
 
 @extend_schema(
@@ -704,11 +786,15 @@ class RateLimitStatusView(APIView):
         user = request.user
         logger.info(f"📊 Rate limit status requested - User: {user.email}")
         
+        # Resolved once for the helpers, the recommendation and the response
+        plan_name = user_plan_name(user)
         scopes = ['ai_responses', 'questionnaires', 'api_calls']
         rate_limits = {}
         
+        # One cache round trip for all three scopes
+        statuses = get_rate_limit_status_bulk(user, scopes, plan_name) or {}
         for scope in scopes:
-            status_data = get_rate_limit_status(user, scope)
+            status_data = statuses.get(scope)
             if status_data:
                 percentage_used = (
                     (status_data['used'] / status_data['limit'] * 100) 
@@ -731,13 +817,13 @@ class RateLimitStatusView(APIView):
                 )
         
         # Determine if user should upgrade
-        upgrade_recommendation = self._get_upgrade_recommendation(user, rate_limits)
+        upgrade_recommendation = self._get_upgrade_recommendation(user, rate_limits, plan_name)
         
         response_data = {
             'user': {
                 'username': user.username,
                 'email': user.email,
-                'plan': user.plan.name if user.plan else 'Free',
+                'plan': plan_name,
             },
             'rate_limits': rate_limits,
             'upgrade_recommendation': upgrade_recommendation
@@ -745,7 +831,7 @@ class RateLimitStatusView(APIView):
         
         logger.info(
             f"✅ Rate limit status returned - User: {user.email}, "
-            f"Plan: {user.plan.name if user.plan else 'Free'}, "
+            f"Plan: {plan_name}, "
             f"Should upgrade: {upgrade_recommendation['should_upgrade']}"
         )
         
@@ -762,11 +848,10 @@ class RateLimitStatusView(APIView):
         else:
             return 'healthy'
     
-    def _get_upgrade_recommendation(self, user, rate_limits):
+    def _get_upgrade_recommendation(self, user, rate_limits, current_plan):
         """
         Determine if user should upgrade their plan based on usage patterns.
         """
-        current_plan = user.plan.name if user.plan else 'Free'
         
         # Check if any limit is close to being exceeded
         high_usage_scopes = []
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0003_alter_airesponse_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airesponse',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='cvquestionnaire',
+            name='submitted_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
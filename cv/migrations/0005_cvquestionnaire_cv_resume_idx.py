@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-16 04:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('cv', '0004_drop_duplicate_timestamp_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cvquestionnaire',
+            index=models.Index(fields=['resume'], name='cv_resume_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 04:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0005_cvquestionnaire_cv_resume_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airesponse',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -34,7 +34,7 @@ class CVQuestionnaire(models.Model):
     location = models.CharField(max_length=255, blank=True, null=True, help_text="location (max 255 characters)")
     application_timeline = models.CharField(max_length=20, choices=APPLICATION_TIMELINE_CHOICES, db_index=True)
     job_description = models.TextField(blank=True, null=True, help_text="job description (max 5000 characters)")
-    submitted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
     resume = models.FileField(upload_to='resumes/', blank=True, null=True)
 
     class Meta:
@@ -43,6 +43,7 @@ class CVQuestionnaire(models.Model):
             models.Index(fields=['position', 'industry'], name='cv_position_industry_idx'),
             models.Index(fields=['experience_level', 'company_size'], name='cv_exp_company_idx'),
             models.Index(fields=['submitted_at'], name='cv_submitted_at_idx'),
+            models.Index(fields=['resume'], name='cv_resume_idx'),
         ]
 
     def clean(self):
@@ -78,7 +79,8 @@ class CVQuestionnaire(models.Model):
 class AIResponse(models.Model):
     questionnaire = models.ForeignKey(CVQuestionnaire, related_name='ai_response', on_delete=models.CASCADE, db_index=True)
     response_text = models.TextField(help_text="ai generated response text")
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # default rather than auto_now_add so bulk inserts can supply their own timestamp
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         indexes = [
@@ -50,7 +50,10 @@ class CVQuestionnaireSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CVQuestionnaire
-        fields = '__all__'
+        fields = [
+            'id', 'user', 'position', 'industry', 'experience_level', 'company_size',
+            'location', 'application_timeline', 'job_description', 'submitted_at', 'resume',
+        ]
         read_only_fields = ['user', 'submitted_at']
 
     def validate_job_description(self, value):
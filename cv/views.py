@@ -300,18 +300,17 @@ class AIResponseViewSet(mixins.ListModelMixin,
             ai_response.full_clean()
             logger.info(f"Successfully created AI response {ai_response.id} for user {request.user.id}")
             
-            # Include updated rate limit info in response
-            updated_rate_status = get_rate_limit_status(request.user, 'ai_responses')
-            
             serializer = self.get_serializer(ai_response)
             response_data = serializer.data
             
-            # Add rate limit info to response
-            if updated_rate_status:
+            # Add rate limit info to response. The throttle recorded this
+            # request before the view ran, so the status read at the start
+            # is already up to date; no second cache read needed
+            if rate_status:
                 response_data['rate_limit_info'] = {
-                    'remaining': updated_rate_status['remaining'],
-                    'limit': updated_rate_status['limit'],
-                    'reset_at': updated_rate_status['reset_at']
+                    'remaining': rate_status['remaining'],
+                    'limit': rate_status['limit'],
+                    'reset_at': rate_status['reset_at']
                 }
             
             return Response(response_data, status=status.HTTP_201_CREATED)
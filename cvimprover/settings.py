@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from corsheaders.defaults import default_headers
 from datetime import timedelta
@@ -33,6 +34,9 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# True under `manage.py test`
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 
 INSTALLED_APPS = [
     "unfold",  # before django.contrib.admin
@@ -80,6 +84,7 @@ MIDDLEWARE = [
 
     'core.middleware.rate_limit.RateLimitMiddleware',
     'core.middleware.rate_limit.RequestLoggingMiddleware',  
+    'core.middleware.cache_invalidation.CacheInvalidationMiddleware',
 ]
 
 ROOT_URLCONF = 'cvimprover.urls'
@@ -140,6 +145,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+if TESTING:
+    # PBKDF2 makes every create_user in the test suite cost ~100ms
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -243,6 +252,9 @@ REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'core.exceptions.custom_exception_handler',
 }
 
+# Emit X-RateLimit-* headers from core.middleware.RateLimitMiddleware
+RATE_LIMIT_EMIT_HEADERS = os.getenv('RATE_LIMIT_EMIT_HEADERS', 'True').lower() in ['true', '1']
+
 REST_AUTH_SERIALIZERS = {
     'USER_DETAILS_SERIALIZER': 'core.serializers.CustomUserDetailsSerializer',
     'REGISTER_SERIALIZER': 'core.serializers.CustomRegisterSerializer',
@@ -287,6 +299,17 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    # Keeps health_check_status warm so /core/health/ is a cache read
+    'refresh-health-check': {
+        'task': 'core.tasks.refresh_health_check',
+        'schedule': 10.0,
+    },
+}
+
+# Report the OpenAI health probe as skipped instead of calling the API:
+# always under the test suite, and on request (e.g. staging without OpenAI)
+HEALTH_CHECK_SKIP_OPENAI = TESTING or os.getenv('HEALTH_CHECK_SKIP_OPENAI', 'False').lower() in ['true', '1']
 
 CACHE_URL = os.getenv('CACHE_URL', 'redis://127.0.0.1:6379/1')
 